@@ -1,22 +1,93 @@
+import asyncio
+import functools
 import voluptuous as vol
 import logging
 
 import xmlrpc.client
 
-from homeassistant.const import (EVENT_HOMEASSISTANT_STOP, CONF_NAME)
+from homeassistant.const import (EVENT_HOMEASSISTANT_STOP, CONF_NAME, CONF_TIMEOUT, CONF_OPTIMISTIC)
+from homeassistant.core import callback
 from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.discovery import async_load_platform
+from homeassistant.helpers.dispatcher import async_dispatcher_connect, async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.entity import Entity
-
-from meshmesh.qtgui.transport import RequestsTransport
+from homeassistant.util.json import save_json
+
+from .hub import MeshMeshHub, DEFAULT_HUB_NAME, DEFAULT_MAX_IN_FLIGHT, DEFAULT_STARTUP_DEADLINE, DEFAULT_TIMEOUT, \
+    DEFAULT_BATCH_TIMEOUT
+from .router import MeshMeshHubRouter
+from .metrics import MeshMeshMetrics
+from .transport import DEFAULT_POOL_SIZE
+from .coordinator import DEFAULT_BATCH_WINDOW, DEFAULT_MAX_BATCH, DEFAULT_CACHE_TTL
+from .push import SIGNAL_PUSH, async_setup_push
+from .commands import DEFAULT_MIN_INTERVAL, async_send_batch
+from .health import MeshMeshCircuitBreaker, MeshMeshNodeUnavailable, DEFAULT_FAILURE_THRESHOLD, DEFAULT_MAX_BACKOFF
+from .store import MeshMeshValueStore
+from .verify import DEFAULT_VERIFY_INTERVAL
+from .shedding import DEFAULT_SHED_LATENCY
+from .delta import MeshMeshDeltaSync, DEFAULT_SYNC_INTERVAL
+from .discovery import ATTR_DISCOVERED, MeshMeshInventory, platform_configs
+from .polling import MeshMeshAdaptivePoller, DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL
 
 _LOGGER = logging.getLogger(__name__)
 
 DOMAIN = 'meshmesh'
+DEPENDENCIES = ['http']
 
 CONF_URL = 'url'
 DEFAULT_URL = "http://localhost:8801/"
 CONF_ADDRESS = 'address'
 DEFAULT_ADDRESS = '0'
+CONF_MAX_IN_FLIGHT = 'max_in_flight'
+CONF_BATCH_WINDOW = 'batch_window'
+CONF_MAX_BATCH = 'max_batch'
+CONF_CACHE_TTL = 'cache_ttl'
+CONF_PUSH_URL = 'push_url'
+CONF_PUSH_TOKEN = 'push_token'
+CONF_ADAPTIVE_POLLING = 'adaptive_polling'
+CONF_MIN_POLL_INTERVAL = 'min_poll_interval'
+CONF_MAX_POLL_INTERVAL = 'max_poll_interval'
+CONF_FAILURE_THRESHOLD = 'failure_threshold'
+CONF_MAX_BACKOFF = 'max_backoff'
+CONF_STARTUP_DEADLINE = 'startup_deadline'
+CONF_RESTORE_VALUES = 'restore_values'
+CONF_RESTORE_SPREAD = 'restore_spread'
+CONF_DISCOVERY = 'discovery'
+CONF_POOL_SIZE = 'pool_size'
+CONF_COMMAND_TIMEOUTS = 'command_timeouts'
+CONF_BATCH_TIMEOUT = 'batch_timeout'
+CONF_VERIFY_INTERVAL = 'verify_interval'
+CONF_HUBS = 'hubs'
+CONF_HUB = 'hub'
+CONF_FIRST_ADDRESS = 'first_address'
+CONF_LAST_ADDRESS = 'last_address'
+CONF_LOAD_SHEDDING = 'load_shedding'
+CONF_SHED_LATENCY = 'shed_latency'
+CONF_DELTA_SYNC = 'delta_sync'
+CONF_SYNC_INTERVAL = 'sync_interval'
+
+SERVICE_DUMP_METRICS = 'dump_metrics'
+ATTR_FILENAME = 'filename'
+DEFAULT_METRICS_FILENAME = 'meshmesh_metrics.json'
+EVENT_METRICS = 'meshmesh_metrics'
+
+SERVICE_APPLY_SCENE = 'apply_scene'
+ATTR_TARGETS = 'targets'
+ATTR_COMMAND = 'command'
+ATTR_ARGS = 'args'
+ATTR_BATCH_SIZE = 'batch_size'
+EVENT_SCENE_APPLIED = 'meshmesh_scene_applied'
+
+SIGNAL_AVAILABLE = 'meshmesh_available_{}'
+SIGNAL_COMMAND = 'meshmesh_command_{}'
+
+SERVICE_DISCOVER = 'discover'
+
+ATTR_VALUE_AGE = 'value_age'
+ATTR_CONFIRMED = 'confirmed'
+
+DEFAULT_RESTORE_SPREAD = 30.0
 
 DEFAULT_ADC_MAX_VOLTS = 1.2
 ESP_ADC_RESOLUTION = 1023.0
@@ -28,38 +99,240 @@ DEVICE = None
 
 ADC_PERCENTAGE = None
 
+HUB_URL = vol.All(cv.string, vol.Match(r'^(https?|tcp|unix)://'))
+
+HUB_SCHEMA = vol.Schema({
+    vol.Required(CONF_NAME): cv.string,
+    vol.Required(CONF_URL): HUB_URL,
+    vol.Optional(CONF_FIRST_ADDRESS): cv.positive_int,
+    vol.Optional(CONF_LAST_ADDRESS): cv.positive_int,
+    vol.Optional(CONF_MAX_IN_FLIGHT): cv.positive_int,
+    vol.Optional(CONF_POOL_SIZE): cv.positive_int,
+})
+
+
+def unique_hub_names(conf):
+    """Reject hubs sharing a name, the hub of the top level url being named default."""
+    names = [DEFAULT_HUB_NAME] if CONF_URL in conf else []
+    for hub_conf in conf.get(CONF_HUBS, []):
+        if hub_conf[CONF_NAME] in names:
+            raise vol.Invalid("duplicate hub name %s" % hub_conf[CONF_NAME], path=[CONF_HUBS])
+        names.append(hub_conf[CONF_NAME])
+    return conf
+
 CONFIG_SCHEMA = vol.Schema({
-    DOMAIN: vol.Schema({
-        vol.Required(CONF_URL): cv.url,
-    }),
+    DOMAIN: vol.All(vol.Schema({
+        vol.Optional(CONF_URL): HUB_URL,
+        vol.Optional(CONF_HUBS): vol.All(cv.ensure_list, [HUB_SCHEMA]),
+        vol.Optional(CONF_MAX_IN_FLIGHT, default=DEFAULT_MAX_IN_FLIGHT): cv.positive_int,
+        vol.Optional(CONF_BATCH_WINDOW, default=DEFAULT_BATCH_WINDOW): vol.Coerce(float),
+        vol.Optional(CONF_MAX_BATCH, default=DEFAULT_MAX_BATCH): cv.positive_int,
+        vol.Optional(CONF_CACHE_TTL, default=DEFAULT_CACHE_TTL): vol.Coerce(float),
+        vol.Inclusive(CONF_PUSH_URL, 'push', msg='push_url requires a push_token'): cv.url,
+        vol.Inclusive(CONF_PUSH_TOKEN, 'push', msg='push_url requires a push_token'): cv.string,
+        vol.Optional(CONF_ADAPTIVE_POLLING, default=False): cv.boolean,
+        vol.Optional(CONF_MIN_POLL_INTERVAL, default=DEFAULT_MIN_POLL_INTERVAL): vol.Coerce(float),
+        vol.Optional(CONF_MAX_POLL_INTERVAL, default=DEFAULT_MAX_POLL_INTERVAL): vol.Coerce(float),
+        vol.Optional(CONF_FAILURE_THRESHOLD, default=DEFAULT_FAILURE_THRESHOLD): cv.positive_int,
+        vol.Optional(CONF_MAX_BACKOFF, default=DEFAULT_MAX_BACKOFF): vol.Coerce(float),
+        vol.Optional(CONF_STARTUP_DEADLINE, default=DEFAULT_STARTUP_DEADLINE): vol.Coerce(float),
+        vol.Optional(CONF_RESTORE_VALUES, default=True): cv.boolean,
+        vol.Optional(CONF_RESTORE_SPREAD, default=DEFAULT_RESTORE_SPREAD): vol.Coerce(float),
+        vol.Optional(CONF_DISCOVERY, default=False): cv.boolean,
+        vol.Optional(CONF_POOL_SIZE, default=DEFAULT_POOL_SIZE): cv.positive_int,
+        vol.Optional(CONF_TIMEOUT, default=DEFAULT_TIMEOUT): vol.Coerce(float),
+        vol.Optional(CONF_COMMAND_TIMEOUTS, default={}): vol.Schema({vol.Match(r'^cmd_\w+$'): vol.Coerce(float)}),
+        vol.Optional(CONF_BATCH_TIMEOUT, default=DEFAULT_BATCH_TIMEOUT): vol.Coerce(float),
+        vol.Optional(CONF_VERIFY_INTERVAL, default=DEFAULT_VERIFY_INTERVAL): vol.Coerce(float),
+        vol.Optional(CONF_LOAD_SHEDDING, default=True): cv.boolean,
+        vol.Optional(CONF_SHED_LATENCY, default=DEFAULT_SHED_LATENCY): vol.Coerce(float),
+        vol.Optional(CONF_DELTA_SYNC, default=False): cv.boolean,
+        vol.Optional(CONF_SYNC_INTERVAL, default=DEFAULT_SYNC_INTERVAL): vol.Coerce(float),
+    }), cv.has_at_least_one_key(CONF_URL, CONF_HUBS), unique_hub_names),
 }, extra=vol.ALLOW_EXTRA)
 
 PLATFORM_SCHEMA = vol.Schema({
     vol.Required(CONF_NAME): cv.string,
     vol.Required(CONF_ADDRESS): cv.positive_int,
+    vol.Optional(CONF_HUB): cv.string,
 }, extra=vol.ALLOW_EXTRA)
 
+SERVICE_DUMP_METRICS_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_FILENAME, default=DEFAULT_METRICS_FILENAME): cv.string,
+})
+
+SCENE_TARGET_SCHEMA = vol.Schema({
+    vol.Required(CONF_ADDRESS): cv.positive_int,
+    vol.Required(ATTR_COMMAND): vol.Match(r'^cmd_\w+$'),
+    vol.Optional(ATTR_ARGS, default=[]): vol.All(cv.ensure_list, [vol.Any(int, float, bool, cv.string)]),
+})
 
-def setup(hass, config):
+SERVICE_APPLY_SCENE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_TARGETS): vol.All(cv.ensure_list, [SCENE_TARGET_SCHEMA]),
+    vol.Optional(ATTR_BATCH_SIZE, default=DEFAULT_MAX_BATCH): cv.positive_int,
+})
+
+
+async def async_setup(hass, config):
     global DEVICE
 
-    url = config[DOMAIN].get(CONF_URL, DEFAULT_URL)
-    DEVICE = xmlrpc.client.ServerProxy(url, transport=RequestsTransport())
+    conf = config[DOMAIN]
+    hubs_conf = list(conf.get(CONF_HUBS, []))
+    if conf.get(CONF_URL) is not None:
+        hubs_conf.insert(0, {CONF_NAME: DEFAULT_HUB_NAME, CONF_URL: conf[CONF_URL]})
+    url = hubs_conf[0][CONF_URL]
+
+    poller = None
+    if conf.get(CONF_ADAPTIVE_POLLING, False):
+        poller = MeshMeshAdaptivePoller(conf.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+                                        conf.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL))
+
+    @callback
+    def _async_circuit_opened(address, backoff):
+        # Entities that are not polled are available again once a command can probe the node
+        async_call_later(hass, backoff, callback(functools.partial(_async_probe_due, address)))
+
+    @callback
+    def _async_probe_due(address, now):
+        async_dispatcher_send(hass, SIGNAL_AVAILABLE.format(address))
+
+    breaker = MeshMeshCircuitBreaker(conf.get(CONF_FAILURE_THRESHOLD, DEFAULT_FAILURE_THRESHOLD),
+                                     max_backoff=conf.get(CONF_MAX_BACKOFF, DEFAULT_MAX_BACKOFF),
+                                     listener=_async_circuit_opened)
+    metrics = MeshMeshMetrics()
+    hubs = []
+    ranges = []
+    for hub_conf in hubs_conf:
+        hub = MeshMeshHub(hass, hub_conf[CONF_URL], hub_conf.get(CONF_MAX_IN_FLIGHT, conf.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT)),
+                          conf.get(CONF_BATCH_WINDOW, DEFAULT_BATCH_WINDOW), conf.get(CONF_MAX_BATCH, DEFAULT_MAX_BATCH),
+                          conf.get(CONF_CACHE_TTL, DEFAULT_CACHE_TTL), poller, breaker,
+                          hub_conf.get(CONF_POOL_SIZE, conf.get(CONF_POOL_SIZE, DEFAULT_POOL_SIZE)), hub_conf[CONF_NAME], metrics)
+        hubs.append(hub)
+        if CONF_FIRST_ADDRESS in hub_conf or CONF_LAST_ADDRESS in hub_conf:
+            ranges.append((hub_conf.get(CONF_FIRST_ADDRESS, 0), hub_conf.get(CONF_LAST_ADDRESS, 0xFFFFFFFF), hub))
+
+    if len(hubs) == 1:
+        DEVICE = hubs[0]
+    else:
+        DEVICE = MeshMeshHubRouter(hass, hubs, ranges, conf.get(CONF_MAX_BATCH, DEFAULT_MAX_BATCH))
+    DEVICE.set_startup_deadline(conf.get(CONF_STARTUP_DEADLINE, DEFAULT_STARTUP_DEADLINE))
+    DEVICE.set_timeouts(conf.get(CONF_TIMEOUT, DEFAULT_TIMEOUT), conf.get(CONF_COMMAND_TIMEOUTS),
+                        conf.get(CONF_BATCH_TIMEOUT, DEFAULT_BATCH_TIMEOUT))
+    DEVICE.set_load_shedding(conf.get(CONF_LOAD_SHEDDING, True), conf.get(CONF_SHED_LATENCY, DEFAULT_SHED_LATENCY))
+    await DEVICE.async_start()
+    DEVICE.verifier.start(conf.get(CONF_VERIFY_INTERVAL, DEFAULT_VERIFY_INTERVAL))
+
+    if conf.get(CONF_RESTORE_VALUES, True):
+        store = MeshMeshValueStore(hass)
+        DEVICE.coordinator.restore(await store.async_load(), conf.get(CONF_RESTORE_SPREAD, DEFAULT_RESTORE_SPREAD))
+        DEVICE.coordinator.store = store
+
+    if conf.get(CONF_PUSH_URL) is not None:
+        await async_setup_push(hass, DEVICE, conf[CONF_PUSH_URL], conf[CONF_PUSH_TOKEN])
+
+    if conf.get(CONF_DELTA_SYNC, False):
+        for hub in DEVICE.hubs:
+            sync = MeshMeshDeltaSync(hass, hub, conf.get(CONF_SYNC_INTERVAL, DEFAULT_SYNC_INTERVAL))
+            sync.start()
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, lambda event, sync=sync: sync.stop())
+
+    async def async_dump_metrics(call):
+        data = DEVICE.metrics.as_dict()
+        path = hass.config.path(call.data.get(ATTR_FILENAME, DEFAULT_METRICS_FILENAME))
+        await hass.async_add_executor_job(save_json, path, data)
+        hass.bus.async_fire(EVENT_METRICS, data)
+        _LOGGER.info("async_dump_metrics: metrics of %d nodes written to %s", len(data['nodes']), path)
+
+    async def async_apply_scene(call):
+        targets = call.data[ATTR_TARGETS]
+        size = call.data.get(ATTR_BATCH_SIZE, DEFAULT_MAX_BATCH)
+        calls = [(target[ATTR_COMMAND], tuple(target[ATTR_ARGS]) + (target[CONF_ADDRESS],)) for target in targets]
+        results = []
+        for chunk in await asyncio.gather(*[async_send_commands(hass, calls[index:index + size])
+                                            for index in range(0, len(calls), size)]):
+            results.extend(chunk)
+
+        report = []
+        for target, result in zip(targets, results):
+            entry = {CONF_ADDRESS: target[CONF_ADDRESS], ATTR_COMMAND: target[ATTR_COMMAND]}
+            if isinstance(result, xmlrpc.client.Fault):
+                entry['error'] = result.faultString
+            elif isinstance(result, Exception):
+                entry['error'] = str(result)
+            else:
+                entry['result'] = result
+            report.append(entry)
+
+        failed = len([entry for entry in report if 'error' in entry])
+        if failed:
+            _LOGGER.warning("async_apply_scene: %d of %d targets failed", failed, len(report))
+        hass.bus.async_fire(EVENT_SCENE_APPLIED, {ATTR_TARGETS: report, 'failed': failed})
+
+    def load_discovered(nodes):
+        for platform, configs in platform_configs(nodes).items():
+            hass.async_create_task(async_load_platform(hass, platform, DOMAIN, {ATTR_DISCOVERED: configs}, config))
+
+    hass.services.async_register(DOMAIN, SERVICE_DUMP_METRICS, async_dump_metrics, schema=SERVICE_DUMP_METRICS_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_APPLY_SCENE, async_apply_scene, schema=SERVICE_APPLY_SCENE_SCHEMA)
+    hass.async_create_task(async_load_platform(hass, 'sensor', DOMAIN, {}, config))
+
+    if conf.get(CONF_DISCOVERY, False):
+        inventory = MeshMeshInventory(hass, DEVICE)
+        load_discovered(await inventory.async_load())
+
+        async def async_discover(call):
+            added = await inventory.async_load(refresh=True)
+            _LOGGER.info("async_discover: %d new nodes", len(added))
+            load_discovered(added)
+
+        hass.services.async_register(DOMAIN, SERVICE_DISCOVER, async_discover)
 
     """Your controller/hub specific code."""
-    hass.bus.listen_once(EVENT_HOMEASSISTANT_STOP, close_xmlrpc)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, close_xmlrpc)
     print(DOMAIN, 'setup', url)
     return True
 
 
-def close_xmlrpc(*args):
-    pass
+async def close_xmlrpc(*args):
+    if DEVICE is not None:
+        await DEVICE.async_close()
+
+
+def value_age_attributes(address):
+    age = DEVICE.coordinator.value_age(address)
+    return {ATTR_VALUE_AGE: int(age)} if age is not None else {}
+
+
+def async_track_available(hass, addresses, action):
+    """Call action when the backoff of the open circuit of one of the node addresses expires, return
+    the unsubscribe callbacks."""
+    return [async_dispatcher_connect(hass, SIGNAL_AVAILABLE.format(address), action) for address in addresses]
+
+
+def async_track_commands(hass, addresses, action):
+    """Call action with the method and the arguments, node address excluded, of the commands acked
+    for one of the node addresses that were sent by async_send_commands."""
+    return [async_dispatcher_connect(hass, SIGNAL_COMMAND.format(address), action) for address in addresses]
+
+
+async def async_send_commands(hass, calls):
+    """Send (method, args) commands in one batch, in order with the command queues of their nodes,
+    and tell the entities of the nodes about the commands that were acked."""
+    results = await async_send_batch(DEVICE, calls)
+    for (method, args), result in zip(calls, results):
+        if not isinstance(result, Exception):
+            async_dispatcher_send(hass, SIGNAL_COMMAND.format(args[-1]), method, args[:-1])
+    return results
 
 
 class MeshMeshConfig(object):
     def __init__(self, config):
         self._config = config
         self._should_poll = config.get("poll", True)
+        if config.get(CONF_HUB) is not None and isinstance(DEVICE, MeshMeshHubRouter):
+            for address in [config.get(CONF_ADDRESS)] + list(config.get("addresses", [])):
+                if address is not None:
+                    DEVICE.assign(address, config[CONF_HUB])
 
     @property
     def name(self):
@@ -104,6 +377,14 @@ class MeshMeshAnalogIn(Entity):
     def should_poll(self):
         return self._config.should_poll
 
+    @property
+    def available(self):
+        return DEVICE.is_available(self._config.address)
+
+    @property
+    def device_state_attributes(self):
+        return value_age_attributes(self._config.address)
+
     @property
     def state(self):
         return self._value
@@ -112,10 +393,12 @@ class MeshMeshAnalogIn(Entity):
     def unit_of_measurement(self):
         return "%"
 
-    def update(self):
+    async def async_update(self):
         try:
             print("MeshMeshAnalogIn.update: %06X" % self._config.address)
-            self._value = int(DEVICE.cmd_read_analog(self._config.address) / ESP_ADC_RESOLUTION * 1000.0) / 10.0
+            self._value = int(await DEVICE.coordinator.async_read('cmd_read_analog', self._config.address) / ESP_ADC_RESOLUTION * 1000.0) / 10.0
+        except MeshMeshNodeUnavailable:
+            pass
         except xmlrpc.client.Fault:
             _LOGGER.warning("MeshMeshAnalogIn.update: Transmission failure with device at addres: %08X", self._config.address)
         except ConnectionError:
@@ -141,10 +424,46 @@ class MeshMeshDigitalInConfig(MeshMeshPinConfig):
         self._should_poll = config.get("poll", True)
 
 
-class MeshMeshDigitalIn(Entity):
+class MeshMeshPushEntity(Entity):
+    """Entity that is updated by hub notifications when it is not polled."""
+    _push_cmd = None
+    _push_unsub = None
+
+    @property
+    def available(self):
+        return DEVICE.is_available(self._config.address)
+
+    @property
+    def device_state_attributes(self):
+        return value_age_attributes(self._config.address)
+
+    async def async_added_to_hass(self):
+        if not self.should_poll and self._push_cmd is not None:
+            self._push_unsub = async_dispatcher_connect(self.hass, SIGNAL_PUSH.format(self._config.address), self._async_pushed)
+
+    async def async_will_remove_from_hass(self):
+        if self._push_unsub is not None:
+            self._push_unsub()
+            self._push_unsub = None
+
+    @callback
+    def _async_pushed(self, cmd, value):
+        if cmd != self._push_cmd or value is None:
+            return
+        self._push_value(value)
+        self.async_schedule_update_ha_state()
+
+    def _push_value(self, value):
+        """Adopt the value of a _push_cmd read notified by the hub."""
+
+
+class MeshMeshDigitalIn(MeshMeshPushEntity):
+    _push_cmd = 'cmd_digital_in'
+
     def __init__(self, hass, config):
         self._config = config
         self._state = False
+        DEVICE.coordinator.register_pin(config.address, config.pin)
 
     @property
     def name(self):
@@ -162,13 +481,18 @@ class MeshMeshDigitalIn(Entity):
     def is_on(self):
         return self._state
 
-    def update(self):
+    def _push_value(self, value):
+        self._state = value & self._config.pin != 0
+
+    async def async_update(self):
         try:
-            value = DEVICE.cmd_digital_in(self._config.pin, self._config.address)
+            value = await DEVICE.coordinator.async_read_pins(self._config.address, self._config.pin)
             if value is None:
                 _LOGGER.error("MeshMeshDigitalIn.update: Null value returnd from device at address %08X", self._config.address)
                 return
-            self._state = value & self._config.pin != 0
+            self._push_value(value)
+        except MeshMeshNodeUnavailable:
+            pass
         except xmlrpc.client.Fault:
             _LOGGER.warning("MeshMeshDigitalIn.update: Transmission failure with device at addres: %08X", self._config.address)
         except ConnectionError:
@@ -180,22 +504,106 @@ class MeshMeshDigitalOutConfig(MeshMeshPinConfig):
         super(MeshMeshDigitalOutConfig, self).__init__(config)
         self._should_poll = config.get("poll", True)
 
+    @property
+    def relay_bank(self):
+        return bool(self._config.get("relay_bank", False))
+
+    @property
+    def optimistic(self):
+        return bool(self._config.get(CONF_OPTIMISTIC, True))
+
 
 class MeshMeshDigitalOut(MeshMeshDigitalIn):
+    """Output pin set through the command queue of its node. The requested state is shown at once and
+    reverted when the hub never acks the command. A non optimistic output shows only the state read back
+    by the hub verifier."""
+
     def __init__(self, hass, config):
         super(MeshMeshDigitalOut, self).__init__(hass, config)
+        self._confirmed_state = self._state
+        self._unconfirmed = 0
+        self._available_unsubs = []
+        if not config.optimistic:
+            DEVICE.verifier.register(self)
 
-    def _set_state(self, state):
-        try:
-            DEVICE.cmd_digital_out(self._config.pin, self._config.pin if state else 0, self._config.address)
-        except xmlrpc.client.Fault:
-            _LOGGER.warning("Transmission failure when attempting to set pin on MeshMesh device at address: %08X", self._config.address)
-        self._state = state
+    @property
+    def available(self):
+        return DEVICE.accepts_commands(self._config.address)
+
+    async def async_added_to_hass(self):
+        await super(MeshMeshDigitalOut, self).async_added_to_hass()
+        self._available_unsubs = async_track_available(self.hass, [self._config.address], self._async_probe_due)
+        self._available_unsubs += async_track_commands(self.hass, [self._config.address], self._async_command_sent)
+
+    async def async_will_remove_from_hass(self):
+        await super(MeshMeshDigitalOut, self).async_will_remove_from_hass()
+        for unsub in self._available_unsubs:
+            unsub()
+        self._available_unsubs = []
+
+    @callback
+    def _async_probe_due(self):
+        self.async_schedule_update_ha_state()
+
+    @callback
+    def _async_command_sent(self, method, args):
+        """Adopt the state set by a scene, which skips the command queue of the output."""
+        if method != 'cmd_digital_out' or not args[0] & self._config.pin:
+            return
+        self._push_value(args[1])
+        if not self._config.optimistic:
+            DEVICE.verifier.request(self)
+        self.async_schedule_update_ha_state()
+
+    @property
+    def device_state_attributes(self):
+        attributes = value_age_attributes(self._config.address)
+        attributes[ATTR_CONFIRMED] = self._unconfirmed == 0
+        return attributes
+
+    def _push_value(self, value):
+        if self._unconfirmed == 0:
+            super(MeshMeshDigitalOut, self)._push_value(value)
+            self._confirmed_state = self._state
+
+    def verify_call(self):
+        return 'cmd_digital_in', (DEVICE.coordinator.pin_mask(self._config.address), self._config.address)
+
+    @callback
+    def async_verified(self, value):
+        if self._unconfirmed == 0:
+            self._push_value(value)
+            if self.hass is not None:
+                self.async_schedule_update_ha_state()
+
+    @callback
+    def _command_done(self, state, success):
+        self._unconfirmed -= 1
+        if success and self._config.optimistic:
+            self._confirmed_state = state
+        elif success:
+            DEVICE.verifier.request(self)
+        if self._unconfirmed == 0:
+            self._state = self._confirmed_state
+        if self.hass is not None:
+            self.async_schedule_update_ha_state()
+
+    async def _async_set_state(self, state):
+        queue = DEVICE.command_queue(self._config.address)
+        done = functools.partial(self._command_done, state)
+        value = self._config.pin if state else 0
+        self._unconfirmed += 1
+        if self._config.relay_bank:
+            queue.submit_masked('digital_out', 'cmd_digital_out', self._config.pin, value, done=done)
+        else:
+            queue.submit(('digital_out', self._config.pin), 'cmd_digital_out', self._config.pin, value, done=done)
+        if self._config.optimistic:
+            self._state = state
         if not self.should_poll:
-            self.schedule_update_ha_state()
+            self.async_schedule_update_ha_state()
 
-    def turn_on(self, **kwargs):
-        self._set_state(True)
+    async def async_turn_on(self, **kwargs):
+        await self._async_set_state(True)
 
-    def turn_off(self, **kwargs):
-        self._set_state(False)
+    async def async_turn_off(self, **kwargs):
+        await self._async_set_state(False)
@@ -0,0 +1,159 @@
+"""Load benchmark of the meshmesh platforms against the local meshmeshhub simulator.
+
+Run it from the Home Assistant configuration directory:
+python -m custom_components.meshmesh.benchmark --entities 500 --rounds 5 --latency 0.005
+
+The binary scenario compares the msgpack transport with the XML-RPC one and needs the msgpack package.
+The multi-hub scenario splits the nodes between --hubs simulated hubs, each with its own mesh airtime.
+"""
+import argparse
+import asyncio
+import time
+
+from homeassistant.core import HomeAssistant
+
+from .. import meshmesh
+from . import binary_sensor, sensor
+from .hub import MeshMeshHub
+from .metrics import MeshMeshMetrics
+from .router import MeshMeshHubRouter
+from .shedding import DEFAULT_SHED_LATENCY
+from .simulator import MeshMeshSimulatedHub, MeshMeshSimulatorServer, MeshMeshBinarySimulatorServer, DEFAULT_FIRST_ADDRESS
+
+ENTITY_MIX = ('temperature', 'humidity', 'pressure', 'current', 'pin', 'dali')
+
+SCENARIOS = {
+    'unbatched': ('xml', {'max_batch': 1, 'cache_ttl': 0.0}),
+    'batched': ('xml', {'cache_ttl': 0.0}),
+    'binary': ('binary', {'max_batch': 1, 'cache_ttl': 0.0}),
+    'binary-batched': ('binary', {'cache_ttl': 0.0}),
+}
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _create_entities(hass, count):
+    """Every simulated node hosts one entity of each kind of ENTITY_MIX."""
+    entities = []
+    for index in range(count):
+        kind = ENTITY_MIX[index % len(ENTITY_MIX)]
+        address = DEFAULT_FIRST_ADDRESS + index // len(ENTITY_MIX)
+        config = {'name': 'bench %d' % index, 'address': address, 'pin': 1 << (index % 8)}
+        if kind == 'pin':
+            entity = binary_sensor.MeshMeshBinarySensor(hass, meshmesh.MeshMeshDigitalInConfig(config))
+        elif kind == 'dali':
+            entity = binary_sensor.MeshMeshBinaryDaliStatus(hass, binary_sensor.MeshMeshBinaryDaliStatusConfig(config))
+        else:
+            entity = sensor.MeshMeshSensor(kind, meshmesh.MeshMeshDigitalInConfig(config))
+        entity.hass = hass
+        entities.append(entity)
+    return entities
+
+
+async def _async_round(entities):
+    latencies = []
+
+    async def _async_timed_update(entity):
+        start = time.monotonic()
+        await entity.async_update()
+        latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*[_async_timed_update(entity) for entity in entities])
+    return time.monotonic() - start, latencies
+
+
+async def async_run_scenario(name, options, url, simulated, args, routes=None):
+    """Run the rounds against url, or against a router of the (url, first address, last address) routes."""
+    hass = HomeAssistant()
+    if routes is None:
+        meshmesh.DEVICE = MeshMeshHub(hass, url, args.max_in_flight, **options)
+    else:
+        metrics = MeshMeshMetrics()
+        hubs = [MeshMeshHub(hass, hub_url, args.max_in_flight, name='hub%d' % index, metrics=metrics, **options)
+                for index, (hub_url, _, _) in enumerate(routes)]
+        ranges = [(first, last, hub) for (_, first, last), hub in zip(routes, hubs)]
+        meshmesh.DEVICE = MeshMeshHubRouter(hass, hubs, ranges, options.get('max_batch', 32))
+    # Shed polls would be answered from the cache and hide the cost of the reads being compared
+    meshmesh.DEVICE.set_load_shedding(False, DEFAULT_SHED_LATENCY)
+    await meshmesh.DEVICE.async_start()
+    entities = _create_entities(hass, args.entities)
+
+    simulated = simulated if isinstance(simulated, list) else [simulated]
+    frames = sum(hub.frames for hub in simulated)
+    elapsed = 0.0
+    latencies = []
+    for _ in range(args.rounds):
+        round_time, round_latencies = await _async_round(entities)
+        elapsed += round_time
+        latencies.extend(round_latencies)
+
+    requests = meshmesh.DEVICE.metrics.total.calls
+    await meshmesh.DEVICE.async_close()
+
+    throughput = len(latencies) / elapsed if elapsed else 0.0
+    print("%-14s %6d updates in %7.2fs %8.1f upd/s  p50 %7.1fms  p95 %7.1fms  p99 %7.1fms  max %7.1fms  "
+          "hub requests %6d  mesh frames %6d" % (
+              name, len(latencies), elapsed, throughput, _percentile(latencies, 0.5) * 1000,
+              _percentile(latencies, 0.95) * 1000, _percentile(latencies, 0.99) * 1000, max(latencies) * 1000,
+              requests, sum(hub.frames for hub in simulated) - frames))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='meshmesh platform load benchmark')
+    parser.add_argument('--entities', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.002, help='simulated airtime of a mesh frame in seconds')
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--parallel-frames', type=int, default=4)
+    parser.add_argument('--max-in-flight', type=int, default=4)
+    parser.add_argument('--url', help='benchmark an external hub or simulator instead of an in-process one')
+    parser.add_argument('--binary-url', help='binary transport url of the external hub or simulator')
+    parser.add_argument('--hubs', type=int, default=2, help='number of simulated hubs of the multi-hub scenario')
+    args = parser.parse_args()
+
+    nodes = (args.entities + len(ENTITY_MIX) - 1) // len(ENTITY_MIX)
+    simulated = MeshMeshSimulatedHub(nodes, latency=args.latency, loss=args.loss, parallel_frames=args.parallel_frames)
+    servers = []
+    urls = {'xml': args.url, 'binary': args.binary_url}
+    if args.url is None:
+        servers.append(MeshMeshSimulatorServer(simulated, port=0))
+        try:
+            servers.append(MeshMeshBinarySimulatorServer(simulated, port=0))
+        except ImportError:
+            print("msgpack is not installed, skipping the binary transport scenarios")
+        for server in servers:
+            server.start()
+            urls['xml' if isinstance(server, MeshMeshSimulatorServer) else 'binary'] = server.url
+
+    print("%d entities on %d nodes, %d rounds, %.1fms airtime, %.1f%% loss" % (
+        args.entities, nodes, args.rounds, args.latency * 1000, args.loss * 100))
+    for name, (transport, options) in SCENARIOS.items():
+        if urls[transport] is not None:
+            asyncio.run(async_run_scenario(name, options, urls[transport], simulated, args))
+
+    if args.url is None and args.hubs > 1:
+        share = (nodes + args.hubs - 1) // args.hubs
+        routes = []
+        meshes = []
+        for index in range(args.hubs):
+            first = DEFAULT_FIRST_ADDRESS + index * share
+            mesh = MeshMeshSimulatedHub(share, first, latency=args.latency, loss=args.loss, parallel_frames=args.parallel_frames)
+            server = MeshMeshSimulatorServer(mesh, port=0)
+            server.start()
+            servers.append(server)
+            meshes.append(mesh)
+            routes.append((server.url, first, first + share - 1))
+        asyncio.run(async_run_scenario('multi-hub', SCENARIOS['batched'][1], None, meshes, args, routes))
+
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -25,15 +25,25 @@ PLATFORM_SCHEMA = meshmesh.PLATFORM_SCHEMA.extend({
 })
 
 
-def setup_platform(hass, config, add_devices, discovery_info=None):
+def _create_device(hass, config):
     if config.get(CONF_MODE) == 'dali':
-        add_devices([MeshMeshBinaryDaliStatus(hass, MeshMeshBinaryDaliStatusConfig(config))], True)
+        return MeshMeshBinaryDaliStatus(hass, MeshMeshBinaryDaliStatusConfig(config))
     elif config.get(CONF_MODE) == 'presence':
-        add_devices([MeshMeshBinaryDaliPresence(hass, MeshMeshBinaryDaliStatusConfig(config))], True)
+        return MeshMeshBinaryDaliPresence(hass, MeshMeshBinaryDaliStatusConfig(config))
     elif config.get(CONF_MODE) == 'pir':
-        add_devices([MeshMeshBinaryPresence(hass, MeshMeshBinaryDaliStatusConfig(config))], True)
+        return MeshMeshBinaryPresence(hass, MeshMeshBinaryDaliStatusConfig(config))
     else:
-        add_devices([MeshMeshBinarySensor(hass, meshmesh.MeshMeshDigitalInConfig(config))], True)
+        return MeshMeshBinarySensor(hass, meshmesh.MeshMeshDigitalInConfig(config))
+
+
+async def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
+    if discovery_info is not None:
+        devices = [_create_device(hass, entity) for entity in discovery_info[meshmesh.ATTR_DISCOVERED]]
+    else:
+        devices = [_create_device(hass, config)]
+
+    async_add_devices(devices)
+    hass.async_create_task(meshmesh.DEVICE.async_initial_update(devices))
 
 
 class MeshMeshBinarySensor(meshmesh.MeshMeshDigitalIn, BinarySensorDevice):
@@ -46,7 +56,7 @@ class MeshMeshBinaryDaliStatusConfig(meshmesh.MeshMeshConfig):
         return self._config.get(CONF_MODE, DEFAULT_MODE)
 
 
-class MeshMeshBinaryBase(BinarySensorDevice):
+class MeshMeshBinaryBase(meshmesh.MeshMeshPushEntity, BinarySensorDevice):
     def __init__(self, hass, config):
         self._config = config
         self._state = False
@@ -69,18 +79,25 @@ class MeshMeshBinaryBase(BinarySensorDevice):
 
 
 class MeshMeshBinaryDaliStatus(MeshMeshBinaryBase):
+    _push_cmd = 'cmd_dali_status'
+
     def __init__(self, hass, config):
         super().__init__(hass, config)
 
-    def update(self):
+    def _push_value(self, value):
+        self._state = (value & 0x02) != 0
+
+    async def async_update(self):
         try:
-            value = meshmesh.DEVICE.cmd_dali_status(self._config.address)
+            value = await meshmesh.DEVICE.coordinator.async_read('cmd_dali_status', self._config.address)
             _LOGGER.debug("MeshMeshBinaryDaliStatus.update readed %d" % value)
             if value is None:
                 _LOGGER.error("Null value returnd from device at address %08X", self._config.address)
                 self._state = True
                 return
-            self._state = (value & 0x02) != 0
+            self._push_value(value)
+        except meshmesh.MeshMeshNodeUnavailable:
+            pass
         except Fault:
             _LOGGER.warning("MeshMeshBinaryDaliStatus.update Transmission failure with device at addres: %08X", self._config.address)
             self._state = True
@@ -89,13 +106,20 @@ class MeshMeshBinaryDaliStatus(MeshMeshBinaryBase):
 
 
 class MeshMeshBinaryPresence(MeshMeshBinaryBase):
+    _push_cmd = 'cmd_custom_presence_get'
+
     def __init__(self, hass, config):
         super().__init__(hass, config)
 
-    def update(self):
+    def _push_value(self, value):
+        self._state = value
+
+    async def async_update(self):
         try:
-            self._state = meshmesh.DEVICE.cmd_custom_presence_get(self._config.address)
+            self._state = await meshmesh.DEVICE.coordinator.async_read('cmd_custom_presence_get', self._config.address)
             _LOGGER.warning("MeshMeshBinaryPresence.update readed %d" % self._state)
+        except meshmesh.MeshMeshNodeUnavailable:
+            pass
         except Fault:
             _LOGGER.warning("MeshMeshBinaryPresence.update Transmission failure with device at addres: %08X", self._config.address)
         except ConnectionError:
@@ -103,13 +127,20 @@ class MeshMeshBinaryPresence(MeshMeshBinaryBase):
 
 
 class MeshMeshBinaryDaliPresence(MeshMeshBinaryBase):
+    _push_cmd = 'cmd_dali_presence'
+
     def __init__(self, hass, config):
         super().__init__(hass, config)
 
-    def update(self):
+    def _push_value(self, value):
+        self._state = value
+
+    async def async_update(self):
         try:
-            self._state = meshmesh.DEVICE.cmd_dali_presence(self._config.address)
+            self._state = await meshmesh.DEVICE.coordinator.async_read('cmd_dali_presence', self._config.address)
             _LOGGER.debug("MeshMeshBinaryDaliPresence.update readed %d" % self._state)
+        except meshmesh.MeshMeshNodeUnavailable:
+            pass
         except Fault:
             _LOGGER.warning("MeshMeshBinaryDaliPresence.update Transmission failure with device at addres: %08X", self._config.address)
         except ConnectionError:
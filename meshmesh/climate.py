@@ -1,11 +1,10 @@
+import functools
 import logging
 from typing import List, Optional
 
 import voluptuous as vol
 import homeassistant.helpers.config_validation as cv
 
-from xmlrpc.client import Fault
-
 from homeassistant.core import callback
 from homeassistant.const import (STATE_OFF)
 from homeassistant.components.climate import ClimateDevice
@@ -15,7 +14,7 @@ from homeassistant.components.climate.const import (HVAC_MODE_DRY, HVAC_MODE_HEA
                                                     FAN_AUTO, FAN_HIGH, FAN_MIDDLE, FAN_LOW,
                                                     SWING_OFF, SWING_BOTH, SWING_HORIZONTAL, SWING_VERTICAL)
 from homeassistant.const import (ATTR_UNIT_OF_MEASUREMENT, ATTR_TEMPERATURE, CONF_TIMEOUT, CONF_CUSTOMIZE)
-from homeassistant.helpers.event import (async_track_state_change)
+from homeassistant.helpers.event import (async_track_state_change, async_call_later)
 from homeassistant.helpers.restore_state import RestoreEntity
 
 from .. import meshmesh
@@ -39,6 +38,7 @@ CONF_SWING_MODES = 'swing_modes'
 CONF_DEFAULT_OPERATION = 'default_operation'
 CONF_DEFAULT_FAN_MODE = 'default_fan_mode'
 CONF_DEFAULT_SWING_MODE = 'default_swing_mode'
+CONF_COALESCE_WINDOW = 'coalesce_window'
 
 
 DEFAULT_TIMEOUT = 10
@@ -47,11 +47,14 @@ DEFAULT_MAX_TEMP = 30
 DEFAULT_TARGET_TEMP = 20
 DEFAULT_TARGET_TEMP_STEP = 1
 DEFAULT_OPERATION_LIST = [HVAC_MODE_OFF, "", HVAC_MODE_AUTO, HVAC_MODE_HEAT, HVAC_MODE_DRY, HVAC_MODE_COOL]
+FRAME_FAN_MODES = {0: 'auto', 1: 'low', 2: 'mid', 3: 'high'}
+FRAME_SWING_MODES = {1: 'low', 3: 'mid', 5: 'high', 7: 'auto'}
 DEFAULT_FAN_MODE_LIST = [FAN_LOW, FAN_MIDDLE, FAN_HIGH, FAN_AUTO]
 DEFAULT_SWING_MODE_LIST = [SWING_OFF, SWING_HORIZONTAL, SWING_VERTICAL, SWING_BOTH]
 DEFAULT_OPERATION = HVAC_MODE_AUTO
 DEFAULT_FAN_MODE = 'auto'
 DEFAULT_SWING_MODE = 'low'
+DEFAULT_COALESCE_WINDOW = 0.5
 
 CUSTOMIZE_SCHEMA = vol.Schema({
     vol.Optional(CONF_OPERATIONS): vol.All(cv.ensure_list, [cv.string]),
@@ -69,10 +72,18 @@ PLATFORM_SCHEMA = meshmesh.PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_DEFAULT_OPERATION, default=DEFAULT_OPERATION): cv.string,
     vol.Optional(CONF_DEFAULT_FAN_MODE, default=DEFAULT_FAN_MODE): cv.string,
     vol.Optional(CONF_DEFAULT_SWING_MODE, default=DEFAULT_SWING_MODE): cv.string,
+    vol.Optional(CONF_COALESCE_WINDOW, default=DEFAULT_COALESCE_WINDOW): vol.Coerce(float),
 })
 
 
 async def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
+    if discovery_info is not None:
+        async_add_devices([_create_device(hass, PLATFORM_SCHEMA(entity)) for entity in discovery_info[meshmesh.ATTR_DISCOVERED]])
+    else:
+        async_add_devices([_create_device(hass, config)])
+
+
+def _create_device(hass, config):
     min_temp = config.get(CONF_MIN_TEMP)
     max_temp = config.get(CONF_MAX_TEMP)
     target_temp = config.get(CONF_TARGET_TEMP)
@@ -83,10 +94,8 @@ async def async_setup_platform(hass, config, async_add_devices, discovery_info=N
     swing_list = config.get(CONF_CUSTOMIZE).get(CONF_SWING_MODES, []) or DEFAULT_SWING_MODE_LIST
     default_swing_mode = config.get(CONF_DEFAULT_SWING_MODE)
 
-    async_add_devices([
-        MeshMeshClimate(hass, MeshMeshClimateConfig(config), min_temp, max_temp, target_temp, target_temp_step,
-                        operation_list, fan_list, default_fan_mode, swing_list, default_swing_mode)
-    ])
+    return MeshMeshClimate(hass, MeshMeshClimateConfig(config), min_temp, max_temp, target_temp, target_temp_step,
+                           operation_list, fan_list, default_fan_mode, swing_list, default_swing_mode)
 
 
 class MeshMeshClimateConfig(meshmesh.MeshMeshConfig):
@@ -98,6 +107,10 @@ class MeshMeshClimateConfig(meshmesh.MeshMeshConfig):
     def temperature_sensor(self):
         return self._config.get(CONF_TEMP_SENSOR, None)
 
+    @property
+    def coalesce_window(self):
+        return float(self._config.get(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW))
+
 
 class MeshMeshClimate(ClimateDevice, RestoreEntity):
 
@@ -127,6 +140,13 @@ class MeshMeshClimate(ClimateDevice, RestoreEntity):
 
         self._default_operation_from_idle = self._config.def_mode
 
+        self._send_unsub = None
+        self._last_sent_frame = None
+        self._confirmed_frame = None
+        self._drifted = False
+        self._unconfirmed = 0
+        self._available_unsubs = []
+
         if self._config.temperature_sensor:
             async_track_state_change(hass, self._config.temperature_sensor, self._async_temp_sensor_changed)
             sensor_state = hass.states.get(self._config.temperature_sensor)
@@ -134,40 +154,112 @@ class MeshMeshClimate(ClimateDevice, RestoreEntity):
                 _LOGGER.warning("MeshMeshClimate.__init__: state:%d", sensor_state)
                 self._async_update_current_temp(sensor_state)
 
-    def _set_state(self):
-        try:
-            mode = DEFAULT_OPERATION_LIST.index(self.current_operation)
-            if self.is_on:
-                mode |= 0x80
-            temp = self.target_temperature
+    def _state_frame(self):
+        mode = DEFAULT_OPERATION_LIST.index(self.current_operation)
+        if self.is_on:
+            mode |= 0x80
+        temp = self.target_temperature
+        fan = 0
+        if self._current_fan_mode == 'low':
+            fan = 1
+        elif self._current_fan_mode == 'mid':
+            fan = 2
+        elif self._current_fan_mode == 'high':
+            fan = 3
+        elif self._current_fan_mode == 'auto':
             fan = 0
-            if self._current_fan_mode == 'low':
-                fan = 1
-            elif self._current_fan_mode == 'mid':
-                fan = 2
-            elif self._current_fan_mode == 'high':
-                fan = 3
-            elif self._current_fan_mode == 'auto':
-                fan = 0
 
+        vane = 1
+        if self._current_swing_mode == 'low':
             vane = 1
-            if self._current_swing_mode == 'low':
-                vane = 1
-            elif self._current_swing_mode == 'mid':
-                vane = 3
-            elif self._current_swing_mode == 'high':
-                vane = 5
-            elif self._current_swing_mode == 'auto':
-                vane = 7
-
-            _LOGGER.warning("MeshMeshClimate._set_state: mode:%d temp:%d fan:%d vane:%d", mode, temp, fan, vane)
-            meshmesh.DEVICE.cmd_clima_set_ac_state(int(mode), int(temp), fan, vane, self._config.address)
-        except Fault as e:
-            _LOGGER.warning("MeshMeshClimate._set_state: Transmission failure with device at addres: %08X",
-                            self._config.address)
-            _LOGGER.warning("MeshMeshClimate._set_state: %s", str(e))
-        except ConnectionError:
-            _LOGGER.warning("MeshMeshClimate._set_state: Connection error with meshmeshhub proxy server")
+        elif self._current_swing_mode == 'mid':
+            vane = 3
+        elif self._current_swing_mode == 'high':
+            vane = 5
+        elif self._current_swing_mode == 'auto':
+            vane = 7
+
+        return int(mode), int(temp), fan, vane
+
+    def _apply_frame(self, frame):
+        """Set the mode, temperature, fan and vane to those of a state frame, the reverse of _state_frame."""
+        mode, temp, fan, vane = frame
+        self._current_hvac_mode = DEFAULT_OPERATION_LIST[mode & 0x7F] if mode & 0x80 else HVAC_MODE_OFF
+        self._target_temperature = temp
+        self._current_fan_mode = FRAME_FAN_MODES.get(fan, self._current_fan_mode)
+        self._current_swing_mode = FRAME_SWING_MODES.get(vane, self._current_swing_mode)
+
+    @callback
+    def _async_command_sent(self, method, args):
+        """Adopt the state set by a scene, which skips the command queue of the unit."""
+        if method != 'cmd_clima_set_ac_state':
+            return
+        self._last_sent_frame = self._confirmed_frame = tuple(args)
+        self._drifted = False
+        if self._unconfirmed == 0:
+            self._apply_frame(args)
+        self.async_schedule_update_ha_state()
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self._available_unsubs = meshmesh.async_track_available(self.hass, [self._config.address], self._async_probe_due)
+        self._available_unsubs += meshmesh.async_track_commands(self.hass, [self._config.address], self._async_command_sent)
+
+    async def async_will_remove_from_hass(self):
+        await super().async_will_remove_from_hass()
+        for unsub in self._available_unsubs:
+            unsub()
+        self._available_unsubs = []
+
+    @callback
+    def _async_probe_due(self):
+        self.async_schedule_update_ha_state()
+
+    @callback
+    def _async_set_state(self):
+        """Send the state once no other change arrives for coalesce_window seconds, so that a mode,
+        temperature and fan change made in a row go out in a single frame."""
+        if self._send_unsub is not None:
+            self._send_unsub()
+            self._send_unsub = None
+        if self._config.coalesce_window > 0:
+            self._send_unsub = async_call_later(self.hass, self._config.coalesce_window, self._async_send_state)
+        else:
+            self.hass.async_create_task(self._async_send_state())
+
+    async def _async_send_state(self, *args):
+        self._send_unsub = None
+        frame = self._state_frame()
+        if frame == self._last_sent_frame and self._unconfirmed == 0:
+            _LOGGER.debug("MeshMeshClimate._async_send_state: state of %08X unchanged, frame skipped", self._config.address)
+            return
+
+        _LOGGER.debug("MeshMeshClimate._set_state: mode:%d temp:%d fan:%d vane:%d", *frame)
+        self._unconfirmed += 1
+        meshmesh.DEVICE.command_queue(self._config.address).submit(
+            'clima', 'cmd_clima_set_ac_state', *frame, done=functools.partial(self._command_done, frame))
+        self.async_schedule_update_ha_state()
+
+    @callback
+    def _command_done(self, frame, success):
+        """Called when the unit acked, or never acked, a state frame. Once no frame is left unacked the
+        entity goes back to the last acked frame, or stays unconfirmed when none was ever acked."""
+        self._unconfirmed -= 1
+        if success:
+            self._last_sent_frame = self._confirmed_frame = frame
+            self._drifted = False
+        else:
+            _LOGGER.warning("MeshMeshClimate._set_state: state of device at addres %08X not acknowledged", self._config.address)
+            if self._unconfirmed == 0 and self._send_unsub is None:
+                if self._confirmed_frame is not None:
+                    self._apply_frame(self._confirmed_frame)
+                else:
+                    self._drifted = True
+        self.async_schedule_update_ha_state()
+
+    @property
+    def device_state_attributes(self):
+        return {meshmesh.ATTR_CONFIRMED: self._unconfirmed == 0 and not self._drifted}
 
     async def _async_temp_sensor_changed(self, entity_id, old_state, new_state):
         if new_state is None:
@@ -226,6 +318,10 @@ class MeshMeshClimate(ClimateDevice, RestoreEntity):
     def should_poll(self):
         return False
 
+    @property
+    def available(self):
+        return meshmesh.DEVICE.accepts_commands(self._config.address)
+
 # ------------------------------------------------------------------------------------------------------------
 # - UnChecked methods
 # ------------------------------------------------------------------------------------------------------------
@@ -290,37 +386,37 @@ class MeshMeshClimate(ClimateDevice, RestoreEntity):
     def supported_features(self):
         return SUPPORT_FLAGS
 
-    def turn_on(self):
+    async def async_turn_on(self):
         if self._current_hvac_mode == STATE_OFF:
-            self.set_hvac_mode(self._last_on_operation)
+            await self.async_set_hvac_mode(self._last_on_operation)
         else:
-            self.set_hvac_mode(self._current_hvac_mode)
+            await self.async_set_hvac_mode(self._current_hvac_mode)
 
-    def turn_off(self):
-        self.set_hvac_mode(STATE_OFF)
+    async def async_turn_off(self):
+        await self.async_set_hvac_mode(STATE_OFF)
 
-    def set_temperature(self, **kwargs):
+    async def async_set_temperature(self, **kwargs):
         if kwargs.get(ATTR_TEMPERATURE) is not None:
             self._target_temperature = kwargs.get(ATTR_TEMPERATURE)
             if not (self._current_hvac_mode.lower() == 'off' or self._current_hvac_mode.lower() == 'idle'):
-                self._set_state()
+                self._async_set_state()
             elif self._default_operation_from_idle is not None:
-                self.set_hvac_mode(self._default_operation_from_idle)
-            self.schedule_update_ha_state()
+                await self.async_set_hvac_mode(self._default_operation_from_idle)
+            self.async_schedule_update_ha_state()
 
-    def set_fan_mode(self, fan):
+    async def async_set_fan_mode(self, fan):
         self._current_fan_mode = fan
         if not (self._current_hvac_mode.lower() == 'off' or self._current_hvac_mode.lower() == 'idle'):
-            self._set_state()
-        self.schedule_update_ha_state()
+            self._async_set_state()
+        self.async_schedule_update_ha_state()
 
-    def set_swing_mode(self, swing):
+    async def async_set_swing_mode(self, swing):
         self._current_swing_mode = swing
         if not (self._current_hvac_mode.lower() == 'off' or self._current_hvac_mode.lower() == 'idle'):
-            self._set_state()
-        self.schedule_update_ha_state()
+            self._async_set_state()
+        self.async_schedule_update_ha_state()
 
-    def set_hvac_mode(self, operation_mode):
+    async def async_set_hvac_mode(self, operation_mode):
         self._current_hvac_mode = operation_mode
-        self._set_state()
-        self.schedule_update_ha_state()
+        self._async_set_state()
+        self.async_schedule_update_ha_state()
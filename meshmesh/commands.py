@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+
+import xmlrpc.client
+
+from collections import OrderedDict
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MIN_INTERVAL = 0.2
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 1.0
+
+# Commands whose first two arguments are a pin mask and the values of the pins
+MASKED_METHODS = ('cmd_digital_out',)
+
+
+class MeshMeshCommandQueue(object):
+    """Write-behind commands for a single node. Commands are sent one at a time, at least min_interval
+    seconds apart, and a command submitted with the key of a command still waiting replaces it (last
+    write wins). A failed command is retried up to max_retries times with an exponential backoff, unless
+    a newer command with the same key supersedes it; a failed masked write is merged into the newer one
+    instead, the newer pins winning where the masks overlap. The done callbacks given to submit are called with
+    True once the hub acks the command, or with False when it is given up."""
+
+    def __init__(self, hass, hub, address, min_interval=DEFAULT_MIN_INTERVAL):
+        self._hass = hass
+        self._hub = hub
+        self._address = address
+        self.min_interval = min_interval
+        self.max_retries = DEFAULT_MAX_RETRIES
+        self.retry_backoff = DEFAULT_RETRY_BACKOFF
+        self._pending = OrderedDict()
+        self._masked = set()
+        self._task = None
+        self._lock = asyncio.Lock()
+        self._last_sent = 0.0
+        self._retry_at = 0.0
+
+    @property
+    def address(self):
+        return self._address
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    @property
+    def lock(self):
+        """Held while a command of the node is in flight."""
+        return self._lock
+
+    def submit(self, key, method, *args, done=None):
+        callbacks = []
+        if key in self._pending:
+            _LOGGER.debug("MeshMeshCommandQueue.submit: %s for %08X superseded", key, self._address)
+            callbacks = self._pending.pop(key)[3]
+        if done is not None:
+            callbacks.append(done)
+        self._pending[key] = (method, args, 0, callbacks)
+        if self._task is None:
+            self._task = self._hass.async_create_task(self._async_run())
+
+    def submit_masked(self, key, method, mask, value, done=None):
+        """Merge a masked port write into the one still waiting with the same key, so that pins of
+        the same port changed together go out in a single frame."""
+        self._masked.add(key)
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending_mask, pending_value = pending[1]
+            value = (pending_value & ~mask) | (value & mask)
+            mask |= pending_mask
+        self.submit(key, method, mask, value, done=done)
+
+    def claim(self, method, args):
+        """Drop the waiting commands replaced by a method(*args) command sent outside the queue and return
+        their done callbacks. A waiting masked write only loses the pins that the command sets."""
+        callbacks = []
+        for key, (pending_method, pending_args, attempts, pending_callbacks) in list(self._pending.items()):
+            if pending_method != method:
+                continue
+            if method in MASKED_METHODS and pending_args[0] & ~args[0]:
+                self._pending[key] = (pending_method, (pending_args[0] & ~args[0], pending_args[1]), attempts, pending_callbacks)
+                continue
+            del self._pending[key]
+            callbacks.extend(pending_callbacks)
+        return callbacks
+
+    def _retry(self, key, method, args, attempts, callbacks):
+        if key in self._pending:
+            pending_method, pending_args, pending_attempts, pending_callbacks = self._pending[key]
+            if key in self._masked:
+                # The pins of the failed write are still to be set, the newer write keeps its own pins
+                mask, value = args
+                pending_mask, pending_value = pending_args
+                args = (pending_mask | mask, (pending_value & pending_mask) | (value & mask & ~pending_mask))
+                self._pending[key] = (pending_method, args, pending_attempts, callbacks + pending_callbacks)
+            else:
+                # A newer command with the same key supersedes the failed one
+                pending_callbacks[:0] = callbacks
+            return
+        if attempts > self.max_retries:
+            _LOGGER.warning("MeshMeshCommandQueue: %s for %08X given up after %d attempts", method, self._address, attempts)
+            for done in callbacks:
+                done(False)
+            return
+        self._pending[key] = (method, args, attempts, callbacks)
+        self._pending.move_to_end(key, last=False)
+        self._retry_at = time.monotonic() + self.retry_backoff * 2 ** (attempts - 1)
+
+    async def _async_send_next(self):
+        key, (method, args, attempts, callbacks) = self._pending.popitem(last=False)
+        self._last_sent = time.monotonic()
+        sent = None
+        try:
+            # Only the first attempt of a command counts toward the node circuit breaker
+            await self._hub.async_call(method, *args, self._address, count_failure=attempts == 0)
+            sent = True
+        except xmlrpc.client.Fault as e:
+            _LOGGER.info("MeshMeshCommandQueue: %s transmission failure with device at addres: %08X (%s)",
+                         method, self._address, e.faultString)
+            sent = False
+        except (xmlrpc.client.Error, ConnectionError) as e:
+            _LOGGER.info("MeshMeshCommandQueue: %s error with meshmeshhub proxy server: %s", method, e)
+            sent = False
+        except Exception:
+            _LOGGER.exception("MeshMeshCommandQueue: %s unexpected error for device at addres: %08X", method, self._address)
+            sent = False
+        finally:
+            if sent is None:
+                # Cancelled while in flight, the command is given up
+                for done in callbacks:
+                    done(False)
+        if not sent:
+            self._retry(key, method, args, attempts + 1, callbacks)
+            return
+        self._retry_at = 0.0
+        self._hub.coordinator.invalidate(self._address)
+        for done in callbacks:
+            done(True)
+
+    async def _async_run(self):
+        try:
+            while self._pending:
+                wait = max(self._last_sent + self.min_interval, self._retry_at) - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                # A batch sent by async_send_batch holds the lock and may take the waiting commands
+                async with self._lock:
+                    if not self._pending:
+                        break
+                    await self._async_send_next()
+        finally:
+            self._task = None
+            # Left over only when the worker is cancelled
+            while self._pending:
+                for done in self._pending.popitem(last=False)[1][3]:
+                    done(False)
+
+
+async def async_send_batch(hub, calls):
+    """Send (method, args) commands, the node address last, in one hub batch, in order with the
+    command queues of the nodes: a command in flight goes out first, and the waiting commands that the
+    batch replaces are dropped, their done callbacks being called with the result of the batch. Return
+    the result, or the exception, of every command."""
+    queues = [hub.command_queue(address) for address in sorted(set(args[-1] for _, args in calls))]
+    locked = []
+    try:
+        # Always locked in address order, so that batches sharing nodes do not deadlock
+        for queue in queues:
+            await queue.lock.acquire()
+            locked.append(queue)
+        callbacks = [hub.command_queue(args[-1]).claim(method, args[:-1]) for method, args in calls]
+        results = await hub.async_batch(calls)
+    finally:
+        for queue in locked:
+            queue.lock.release()
+
+    for (method, args), result, claimed in zip(calls, results, callbacks):
+        hub.coordinator.invalidate(args[-1])
+        for done in claimed:
+            done(not isinstance(result, Exception))
+    return results
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import random
+import time
+
+import xmlrpc.client
+
+from .scheduler import PRIORITY_POLL
+from .health import MeshMeshNodeUnavailable
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WINDOW = 0.05
+DEFAULT_MAX_BATCH = 32
+DEFAULT_CACHE_TTL = 10.0
+
+
+class MeshMeshCoordinator(object):
+    """Gather the reads issued during a poll cycle into system.multicall batches. While synced is
+    set the cache is kept current by a delta sync and cached reads are never sent to the hub."""
+
+    def __init__(self, hass, hub, window=DEFAULT_BATCH_WINDOW, max_batch=DEFAULT_MAX_BATCH, cache_ttl=DEFAULT_CACHE_TTL,
+                 poller=None):
+        self._hass = hass
+        self._hub = hub
+        self._poller = poller
+        self._priority = PRIORITY_POLL
+        self._window = window
+        self._max_batch = max_batch
+        self._cache_ttl = cache_ttl
+        self._multicall = True
+        self._pending = []
+        self._flush_handle = None
+        self._inflight = {}
+        self._cache = {}
+        self._pin_masks = {}
+        self._restored = {}
+        self._updated = {}
+        self.store = None
+        self.synced = False
+
+    def restore(self, entries, spread):
+        """Serve the (key, value, timestamp) entries saved before a restart until a refresh time picked
+        at random within spread seconds, so the first real reads do not all hit the hub at once."""
+        now = time.monotonic()
+        for key, value, timestamp in entries:
+            self._restored[key] = (value, now + random.uniform(0.0, spread))
+            self._updated[key[-1]] = max(self._updated.get(key[-1], 0.0), timestamp)
+
+    def value_age(self, address):
+        """Seconds since the last value read from the node, restored values included."""
+        updated = self._updated.get(address)
+        return None if updated is None else time.time() - updated
+
+    def register_pin(self, address, pin):
+        self._pin_masks[address] = self._pin_masks.get(address, 0) | pin
+
+    def pin_mask(self, address):
+        return self._pin_masks.get(address, 0)
+
+    async def async_read_pins(self, address, pin):
+        """Read the port of a node once for every registered pin and return the whole bitmask."""
+        self.register_pin(address, pin)
+        return await self.async_read('cmd_digital_in', self._pin_masks[address], address, cached=True)
+
+    def clear(self):
+        self._cache.clear()
+
+    def apply_changes(self, changes):
+        """Store the values of a changes_since reply. A change of a read cached with other arguments,
+        like a port read with another pin mask, drops the cached values of that read."""
+        now = time.monotonic()
+        for change in changes:
+            address = change['address']
+            value = change['value']
+            key = (change['cmd'],) + tuple(change.get('args', [])) + (address,)
+            if key == ('cmd_digital_in', address) and address in self._pin_masks:
+                # The whole port changed, keep it as the read of the registered pins
+                key = ('cmd_digital_in', self._pin_masks[address], address)
+                value &= self._pin_masks[address]
+            for stale in [stale for stale in self._cache if stale[0] == key[0] and stale[-1] == address and stale != key]:
+                del self._cache[stale]
+            self._restored.pop(key, None)
+            self._cache[key] = (now, value)
+            self._updated[address] = time.time()
+            if self.store is not None:
+                self.store.async_record(key, value)
+
+    def invalidate(self, address):
+        for key in [key for key in self._cache if key[-1] == address]:
+            del self._cache[key]
+        for key in [key for key in self._restored if key[-1] == address]:
+            del self._restored[key]
+
+    async def async_read(self, method, *args, cached=False):
+        """Queue a read for the next batch. Identical reads in flight share one request, cached reads
+        are answered from the last result for cache_ttl seconds."""
+        key = (method,) + args
+        restored = self._restored.get(key)
+        if restored is not None:
+            if time.monotonic() < restored[1]:
+                return restored[0]
+            del self._restored[key]
+
+        entry = self._cache.get(key)
+        if entry is not None:
+            if self.synced:
+                return entry[1]
+            if cached and time.monotonic() - entry[0] < self._cache_ttl:
+                return entry[1]
+            if self._poller is not None and not self._poller.is_due(args[-1]):
+                return entry[1]
+            if self._hub.shedder.should_shed(method):
+                return entry[1]
+
+        future = self._inflight.get(key)
+        if future is None:
+            if not self._hub.breaker.allow(args[-1]):
+                raise MeshMeshNodeUnavailable(args[-1])
+            future = self._hass.loop.create_future()
+            future.add_done_callback(lambda f: self._read_done(key, f))
+            self._inflight[key] = future
+            self._pending.append((method, args, future))
+            if len(self._pending) >= self._max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = self._hass.loop.call_later(self._window, self._flush)
+        return await asyncio.shield(future)
+
+    def _read_done(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if future.cancelled():
+            return
+        if future.exception() is None:
+            self._cache[key] = (time.monotonic(), future.result())
+            self._updated[key[-1]] = time.time()
+            if self.store is not None:
+                self.store.async_record(key, future.result())
+            self._hub.breaker.record_success(key[-1])
+            if self._poller is not None:
+                self._poller.record_result(key[-1], key, future.result())
+        elif isinstance(future.exception(), xmlrpc.client.Fault):
+            self._hub.breaker.record_failure(key[-1])
+            if self._poller is not None:
+                self._poller.record_failure(key[-1])
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._hass.async_create_task(self._async_send(batch))
+
+    async def _async_send(self, batch):
+        if len(batch) == 1 or not self._multicall:
+            await asyncio.gather(*[self._async_send_single(method, args, future) for method, args, future in batch])
+            return
+
+        calls = [{'methodName': method, 'params': list(args)} for method, args, _ in batch]
+        try:
+            results = await self._hub.async_multicall(calls, priority=self._priority)
+        except xmlrpc.client.Fault as e:
+            _LOGGER.warning("MeshMeshCoordinator._async_send: system.multicall not supported by hub (%s), falling back to single calls", e.faultString)
+            self._multicall = False
+            await self._async_send(batch)
+            return
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, dict):
+                future.set_exception(xmlrpc.client.Fault(result.get('faultCode'), result.get('faultString')))
+            else:
+                future.set_result(result[0])
+
+    async def _async_send_single(self, method, args, future):
+        try:
+            result = await self._hub.async_request(method, *args, priority=self._priority)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
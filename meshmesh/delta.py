@@ -0,0 +1,103 @@
+import logging
+
+import xmlrpc.client
+
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .push import SIGNAL_PUSH
+from .scheduler import PRIORITY_POLL
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SYNC_INTERVAL = 5.0
+
+
+def _parse_changes(reply):
+    """Return the sequence number and the changes of a changes_since reply, raise KeyError, TypeError
+    or ValueError when it is malformed."""
+    if not isinstance(reply, dict):
+        raise TypeError(reply)
+    changes = reply.get('changes', [])
+    if not isinstance(changes, list):
+        raise TypeError(changes)
+    return int(reply['seq']), [{'address': int(change['address']), 'cmd': str(change['cmd']),
+                                'args': list(change.get('args', [])), 'value': change['value']}
+                               for change in changes]
+
+
+class MeshMeshDeltaSync(object):
+    """Keep the read cache of a hub up to date with its changes_since method.
+
+    changes_since(seq) returns {"seq": last sequence number, "changes": [change, ...]}, a change being
+    {"address": 1234, "cmd": "cmd_weather_data", "args": [], "value": [21.5, 1013.2, 45.0]} for every
+    read whose value changed after seq, args excluding the node address. Sequence 0 returns the last
+    value of every read the hub knows about. While the sync works the coordinator answers the polls
+    from its cache, so a quiet mesh costs one small request per interval."""
+
+    def __init__(self, hass, hub, interval=DEFAULT_SYNC_INTERVAL):
+        self._hass = hass
+        self._hub = hub
+        self._interval = interval
+        self._seq = 0
+        self._handle = None
+        self._running = False
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._handle = self._hass.loop.call_later(0, self._schedule)
+
+    def stop(self):
+        self._running = False
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self._handle = None
+        self._hass.async_create_task(self._async_run())
+
+    async def _async_run(self):
+        # The next sync is scheduled once this one completes, two syncs from the same seq could end in
+        # any order and the older reply would look like a hub restart
+        try:
+            await self.async_sync()
+        finally:
+            if self._running:
+                self._handle = self._hass.loop.call_later(self._interval, self._schedule)
+
+    async def async_sync(self):
+        coordinator = self._hub.coordinator
+        synced = False
+        try:
+            reply = await self._hub.async_request('changes_since', self._seq, priority=PRIORITY_POLL)
+            seq, changes = _parse_changes(reply)
+            if seq < self._seq:
+                _LOGGER.info("MeshMeshDeltaSync.async_sync: hub %s restarted, full resync", self._hub.name)
+                coordinator.clear()
+                self._seq = 0
+                return
+
+            coordinator.apply_changes(changes)
+            synced = True
+            self._seq = seq
+        except xmlrpc.client.Fault as e:
+            _LOGGER.warning("MeshMeshDeltaSync.async_sync: changes_since failed on hub %s (%s)", self._hub.name, e.faultString)
+            return
+        except (xmlrpc.client.Error, ConnectionError) as e:
+            _LOGGER.warning("MeshMeshDeltaSync.async_sync: error with meshmeshhub %s: %s", self._hub.name, e)
+            return
+        except (KeyError, TypeError, ValueError):
+            _LOGGER.warning("MeshMeshDeltaSync.async_sync: malformed changes_since reply from hub %s", self._hub.name)
+            return
+        finally:
+            # Polls go to the hub again as soon as a sync fails
+            coordinator.synced = synced
+
+        for change in changes:
+            async_dispatcher_send(self._hass, SIGNAL_PUSH.format(change['address']), change['cmd'], change['value'])
+        _LOGGER.debug("MeshMeshDeltaSync.async_sync: %d changes from hub %s up to %d", len(changes), self._hub.name, self._seq)
@@ -0,0 +1,114 @@
+import logging
+
+import xmlrpc.client
+
+from homeassistant.helpers.storage import Store
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = 'meshmesh.inventory'
+STORAGE_VERSION = 1
+
+ATTR_DISCOVERED = 'discovered'
+
+SENSOR_CAPABILITIES = ('thermometer', 'current', 'analog')
+WEATHER_TYPES = ('temperature', 'pressure', 'humidity')
+PIN_COUNT = 16
+
+
+def _pins(mask):
+    return [1 << bit for bit in range(PIN_COUNT) if mask & (1 << bit)]
+
+
+def node_entities(node):
+    """Return the (platform, config) of the entities of a node of the hub inventory."""
+    address = node['address']
+    capabilities = node.get('capabilities') or {}
+    prefix = node.get('name') or 'meshmesh %08X' % address
+    entities = []
+
+    def _add(platform, suffix, **config):
+        config.update({'name': '%s %s' % (prefix, suffix), 'address': address})
+        if 'hub' in node:
+            config['hub'] = node['hub']
+        entities.append((platform, config))
+
+    if capabilities.get('weather'):
+        for typ in WEATHER_TYPES:
+            _add('sensor', typ, type=typ)
+    for typ in SENSOR_CAPABILITIES:
+        if capabilities.get(typ):
+            _add('sensor', typ, type=typ, pin=0)
+
+    for pin in _pins(capabilities.get('digital_in', 0)):
+        _add('binary_sensor', 'in %d' % pin.bit_length(), mode='pin', pin=pin)
+    outputs = _pins(capabilities.get('digital_out', 0))
+    for pin in outputs:
+        _add('switch', 'out %d' % pin.bit_length(), pin=pin, relay_bank=len(outputs) > 1)
+
+    if capabilities.get('dali'):
+        _add('light', 'light', mode='dali')
+        _add('binary_sensor', 'lamp', mode='dali', pin=0)
+    if capabilities.get('dali_presence'):
+        _add('binary_sensor', 'presence', mode='presence', pin=0)
+    if capabilities.get('presence'):
+        _add('binary_sensor', 'pir', mode='pir', pin=0)
+    if capabilities.get('light'):
+        _add('light', 'light', mode=capabilities['light'])
+    if capabilities.get('clima'):
+        _add('climate', 'clima')
+    return entities
+
+
+def platform_configs(nodes):
+    """Group the entities of the given nodes by platform, so that each platform is set up once."""
+    platforms = {}
+    for node in nodes:
+        for platform, config in node_entities(node):
+            platforms.setdefault(platform, []).append(config)
+    return platforms
+
+
+class MeshMeshInventory(object):
+    """Nodes of the mesh and their firmware capabilities, as reported by the hub node_inventory method.
+    The inventory is kept in .storage and the hubs are asked again only when a refresh is requested.
+    With several hubs every node is tagged with the name of the hub that reported it."""
+
+    def __init__(self, hass, hub):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._hub = hub
+        self._nodes = {}
+
+    @property
+    def nodes(self):
+        return list(self._nodes.values())
+
+    async def async_load(self, refresh=False):
+        """Load the inventory, return the nodes that were not known before."""
+        data = None if refresh else await self._store.async_load()
+        if data is None:
+            nodes = []
+            for hub in self._hub.hubs:
+                try:
+                    hub_nodes = await hub.async_request('node_inventory')
+                except xmlrpc.client.Fault as e:
+                    _LOGGER.warning("MeshMeshInventory.async_load: node_inventory not supported by hub %s (%s)", hub.name, e.faultString)
+                    return []
+                except xmlrpc.client.Error as e:
+                    _LOGGER.warning("MeshMeshInventory.async_load: node_inventory failed on hub %s: %s", hub.name, e)
+                    return []
+                except ConnectionError:
+                    _LOGGER.warning("MeshMeshInventory.async_load: Connection error with meshmeshhub %s", hub.name)
+                    return []
+                if len(self._hub.hubs) > 1:
+                    for node in hub_nodes:
+                        node['hub'] = hub.name
+                nodes.extend(hub_nodes)
+            await self._store.async_save({'nodes': nodes})
+            _LOGGER.info("MeshMeshInventory.async_load: %d nodes reported by the hub", len(nodes))
+        else:
+            nodes = data.get('nodes', [])
+
+        added = [node for node in nodes if node['address'] not in self._nodes]
+        self._nodes.update({node['address']: node for node in nodes})
+        return added
@@ -0,0 +1,100 @@
+import logging
+import time
+
+import xmlrpc.client
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_BASE_BACKOFF = 30.0
+DEFAULT_MAX_BACKOFF = 900.0
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class MeshMeshNodeUnavailable(xmlrpc.client.Fault):
+    def __init__(self, address):
+        super().__init__(-1, "Node %08X is unavailable" % address)
+        self.address = address
+
+
+class _NodeCircuit(object):
+    def __init__(self):
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0.0
+        self.probe_started = None
+
+
+class MeshMeshCircuitBreaker(object):
+    """Track transmission failures per node address. After failure_threshold consecutive failures the
+    node circuit opens and no request is sent until the backoff expires, then a single probe is let
+    through: success closes the circuit, failure opens it again with a doubled backoff.
+
+    listener, when set, is called with the node address and the backoff every time a circuit opens."""
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, base_backoff=DEFAULT_BASE_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF, listener=None):
+        self._failure_threshold = failure_threshold
+        self._base_backoff = base_backoff
+        self._max_backoff = max(base_backoff, max_backoff)
+        self._nodes = {}
+        self.listener = listener
+
+    def _backoff(self, circuit):
+        return min(self._max_backoff, self._base_backoff * (2 ** (circuit.trips - 1)))
+
+    def state(self, address):
+        circuit = self._nodes.get(address)
+        return STATE_CLOSED if circuit is None else circuit.state
+
+    def is_available(self, address):
+        return self.state(address) == STATE_CLOSED
+
+    def accepts_commands(self, address):
+        """Return False only while the node circuit is open and its backoff has not expired, so that
+        an entity that is never polled is available again when its next command can be the probe."""
+        circuit = self._nodes.get(address)
+        return circuit is None or circuit.state != STATE_OPEN or time.monotonic() >= circuit.retry_at
+
+    def allow(self, address):
+        circuit = self._nodes.get(address)
+        if circuit is None or circuit.state == STATE_CLOSED:
+            return True
+
+        now = time.monotonic()
+        if circuit.state == STATE_OPEN:
+            if now < circuit.retry_at:
+                return False
+            circuit.state = STATE_HALF_OPEN
+            circuit.probe_started = now
+            _LOGGER.debug("MeshMeshCircuitBreaker.allow: probing node %08X", address)
+            return True
+
+        # Half open: one probe at a time, a lost probe is replaced after a backoff period
+        if now - circuit.probe_started >= self._backoff(circuit):
+            circuit.probe_started = now
+            return True
+        return False
+
+    def record_success(self, address):
+        circuit = self._nodes.pop(address, None)
+        if circuit is not None and circuit.state != STATE_CLOSED:
+            _LOGGER.info("MeshMeshCircuitBreaker: node %08X is reachable again", address)
+
+    def record_failure(self, address):
+        circuit = self._nodes.get(address)
+        if circuit is None:
+            circuit = self._nodes[address] = _NodeCircuit()
+        circuit.failures += 1
+        if circuit.state == STATE_HALF_OPEN or circuit.failures >= self._failure_threshold:
+            if circuit.state == STATE_CLOSED:
+                _LOGGER.warning("MeshMeshCircuitBreaker: node %08X unreachable after %d failures", address, circuit.failures)
+            circuit.state = STATE_OPEN
+            circuit.trips += 1
+            circuit.retry_at = time.monotonic() + self._backoff(circuit)
+            if self.listener is not None:
+                self.listener(address, self._backoff(circuit))
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import time
+
+import xmlrpc.client
+
+from .transport import create_transport, DEFAULT_POOL_SIZE
+from .scheduler import MeshMeshPriorityLimiter, PRIORITY_COMMAND, PRIORITY_POLL
+from .metrics import MeshMeshMetrics, OUTCOME_OK, OUTCOME_FAULT, OUTCOME_ERROR, OUTCOME_TIMEOUT
+from .commands import MeshMeshCommandQueue
+from .health import MeshMeshCircuitBreaker, MeshMeshNodeUnavailable
+from .coordinator import MeshMeshCoordinator, DEFAULT_BATCH_WINDOW, DEFAULT_MAX_BATCH, DEFAULT_CACHE_TTL
+from .verify import MeshMeshVerifier
+from .shedding import MeshMeshLoadShedder
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_HUB_NAME = 'default'
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_STARTUP_DEADLINE = 10.0
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_BATCH_TIMEOUT = 30.0
+RECONNECT_INTERVAL = 5.0
+
+
+class MeshMeshHub(object):
+    """Asyncio client for the meshmeshhub proxy server, the transport is chosen by the url scheme."""
+
+    def __init__(self, hass, url, max_in_flight=DEFAULT_MAX_IN_FLIGHT, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_batch=DEFAULT_MAX_BATCH, cache_ttl=DEFAULT_CACHE_TTL, poller=None, breaker=None,
+                 pool_size=DEFAULT_POOL_SIZE, name=DEFAULT_HUB_NAME, metrics=None):
+        self._hass = hass
+        self._url = url
+        self._name = name
+        self._transport = create_transport(url, pool_size)
+        self._timeout = DEFAULT_TIMEOUT
+        self._timeouts = {}
+        self._batch_timeout = DEFAULT_BATCH_TIMEOUT
+        self._reconnected = 0.0
+        self._limiter = MeshMeshPriorityLimiter(max_in_flight)
+        self._shedder = MeshMeshLoadShedder(self._limiter)
+        self._breaker = breaker if breaker is not None else MeshMeshCircuitBreaker()
+        self._metrics = metrics if metrics is not None else MeshMeshMetrics()
+        self._queues = {}
+        self._multicall = True
+        self._startup_deadline = time.monotonic() + DEFAULT_STARTUP_DEADLINE
+        self._unresolved = {}
+        self._coordinator = MeshMeshCoordinator(hass, self, batch_window, max_batch, cache_ttl, poller)
+        self._verifier = MeshMeshVerifier(hass, self, max_batch)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def url(self):
+        return self._url
+
+    @property
+    def hubs(self):
+        return [self]
+
+    @property
+    def coordinator(self):
+        return self._coordinator
+
+    @property
+    def verifier(self):
+        return self._verifier
+
+    @property
+    def shedder(self):
+        return self._shedder
+
+    @property
+    def shedding_level(self):
+        return self._shedder.level
+
+    def shedding_state(self):
+        return self._shedder.as_dict()
+
+    def set_load_shedding(self, enabled, latency_threshold):
+        self._shedder.enabled = enabled
+        self._shedder.latency_threshold = latency_threshold
+
+    @property
+    def breaker(self):
+        return self._breaker
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def is_available(self, address):
+        return address not in self._unresolved and self._breaker.is_available(address)
+
+    def accepts_commands(self, address):
+        return self._breaker.accepts_commands(address)
+
+    def set_startup_deadline(self, seconds):
+        self._startup_deadline = time.monotonic() + seconds
+
+    def set_timeouts(self, default, commands=None, batch=DEFAULT_BATCH_TIMEOUT):
+        """Set the deadline of a hub request, in seconds, the deadlines of single commands and the cap
+        of the deadline of a system.multicall batch."""
+        self._timeout = default
+        self._timeouts = dict(commands or {})
+        self._batch_timeout = batch
+
+    def timeout(self, method, args):
+        if method == 'system.multicall':
+            # The calls of a batch run one after the other, but a hung batch must not hold its slot for
+            # minutes: the deadline is capped, never below the deadline of its slowest call
+            timeouts = [self._timeouts.get(call['methodName'], self._timeout) for call in args[0]] or [self._timeout]
+            return min(sum(timeouts), max(self._batch_timeout, max(timeouts)))
+        return self._timeouts.get(method, self._timeout)
+
+    async def async_initial_update(self, entities):
+        """Run the first update of entities added without update_before_add concurrently, so that
+        their reads share the coordinator batches. Entities still waiting at the startup deadline are
+        reported unavailable until their first update completes."""
+        tasks = {self._hass.async_create_task(entity.async_update()): entity for entity in entities}
+        if not tasks:
+            return
+        timeout = max(0.0, self._startup_deadline - time.monotonic())
+        done, pending = await asyncio.wait(list(tasks), timeout=timeout)
+
+        for task in done:
+            self._initial_update_done(tasks[task], task, False)
+        for task in pending:
+            entity = tasks[task]
+            address = entity.config.address
+            self._unresolved[address] = self._unresolved.get(address, 0) + 1
+            _LOGGER.info("MeshMeshHub.async_initial_update: %s not updated within the startup deadline", entity.name)
+            task.add_done_callback(lambda t, entity=entity: self._initial_update_done(entity, t, True))
+
+    def _initial_update_done(self, entity, task, late):
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.warning("MeshMeshHub.async_initial_update: %s failed: %s", entity.name, task.exception())
+        if late:
+            address = entity.config.address
+            self._unresolved[address] -= 1
+            if self._unresolved[address] <= 0:
+                del self._unresolved[address]
+        if entity.hass is not None:
+            entity.async_schedule_update_ha_state()
+
+    def command_queue(self, address, min_interval=None):
+        queue = self._queues.get(address)
+        if queue is None:
+            queue = self._queues[address] = MeshMeshCommandQueue(self._hass, self, address)
+        if min_interval is not None:
+            queue.min_interval = min_interval
+        return queue
+
+    async def async_start(self):
+        await self._transport.async_start()
+
+    async def async_close(self):
+        self._verifier.stop()
+        await self._transport.async_close()
+
+    @property
+    def limiter(self):
+        return self._limiter
+
+    async def _async_reconnect(self):
+        now = time.monotonic()
+        if now - self._reconnected < RECONNECT_INTERVAL:
+            return
+        self._reconnected = now
+        _LOGGER.info("MeshMeshHub: reconnecting to %s", self._url)
+        await self._transport.async_reconnect()
+
+    async def async_request(self, method, *args, priority=PRIORITY_COMMAND):
+        """Send one request to the hub without looking at the node circuit breaker."""
+        address = args[-1] if method.startswith('cmd_') and args else None
+        # The calls of a multicall run one after the other, the shedder compares the latency of each
+        calls = max(1, len(args[0])) if method == 'system.multicall' else 1
+        start = None
+        try:
+            async with self._limiter.slot(priority):
+                start = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(self._transport.async_call(method, args), self.timeout(method, args))
+                except asyncio.TimeoutError as e:
+                    raise ConnectionError("MeshMeshHub: %s not completed within %.1fs" % (method, self.timeout(method, args))) from e
+        except xmlrpc.client.Fault:
+            self._metrics.record(method, address, time.monotonic() - start, OUTCOME_FAULT)
+            self._shedder.record((time.monotonic() - start) / calls)
+            raise
+        except (ConnectionError, xmlrpc.client.ProtocolError) as e:
+            if start is not None:
+                timeout = isinstance(e.__cause__, asyncio.TimeoutError)
+                self._metrics.record(method, address, time.monotonic() - start, OUTCOME_TIMEOUT if timeout else OUTCOME_ERROR)
+                if timeout:
+                    self._shedder.record((time.monotonic() - start) / calls)
+                if not timeout and isinstance(e, ConnectionError):
+                    await self._async_reconnect()
+            raise
+        self._metrics.record(method, address, time.monotonic() - start, OUTCOME_OK)
+        self._shedder.record((time.monotonic() - start) / calls)
+        return result
+
+    async def async_call(self, method, *args, priority=PRIORITY_COMMAND, count_failure=True):
+        """Send a request through the node circuit breaker. With count_failure False a fault is not
+        counted as a node failure, for the retries of a command whose first failure was counted."""
+        address = args[-1] if method.startswith('cmd_') and args else None
+        if address is None:
+            return await self.async_request(method, *args, priority=priority)
+
+        if not self._breaker.allow(address):
+            raise MeshMeshNodeUnavailable(address)
+        try:
+            result = await self.async_request(method, *args, priority=priority)
+        except xmlrpc.client.Fault:
+            if count_failure:
+                self._breaker.record_failure(address)
+            raise
+        self._breaker.record_success(address)
+        return result
+
+    async def async_batch(self, calls, priority=PRIORITY_COMMAND):
+        """Send a list of (method, args) commands in one system.multicall request, or as parallel
+        requests when the hub has no multicall. Return the result, or the exception, of every command."""
+        results = [None] * len(calls)
+        allowed = []
+        for index, (method, args) in enumerate(calls):
+            if self._breaker.allow(args[-1]):
+                allowed.append(index)
+            else:
+                results[index] = MeshMeshNodeUnavailable(args[-1])
+
+        replies = None
+        if self._multicall and len(allowed) > 1:
+            try:
+                replies = await self.async_multicall([{'methodName': calls[index][0], 'params': list(calls[index][1])}
+                                                      for index in allowed], priority=priority)
+                replies = [xmlrpc.client.Fault(reply.get('faultCode'), reply.get('faultString'))
+                           if isinstance(reply, dict) else reply[0] for reply in replies]
+            except xmlrpc.client.Fault as e:
+                _LOGGER.warning("MeshMeshHub.async_batch: system.multicall not supported by hub (%s), using parallel requests", e.faultString)
+                self._multicall = False
+            except (ConnectionError, xmlrpc.client.ProtocolError) as e:
+                replies = [e] * len(allowed)
+
+        if replies is None:
+            replies = await asyncio.gather(*[self.async_request(calls[index][0], *calls[index][1], priority=priority)
+                                             for index in allowed], return_exceptions=True)
+
+        for index, reply in zip(allowed, replies):
+            results[index] = reply
+            address = calls[index][1][-1]
+            if isinstance(reply, xmlrpc.client.Fault):
+                self._breaker.record_failure(address)
+            elif not isinstance(reply, Exception):
+                self._breaker.record_success(address)
+        return results
+
+    async def async_multicall(self, calls, priority=PRIORITY_POLL):
+        start = time.monotonic()
+        results = await self.async_request('system.multicall', calls, priority=priority)
+        # The calls of a batch run one after the other, each is given its share of the batch time
+        latency = (time.monotonic() - start) / max(1, len(calls))
+        for call, result in zip(calls, results):
+            address = call['params'][-1] if call['params'] else None
+            self._metrics.record(call['methodName'], address, latency, OUTCOME_FAULT if isinstance(result, dict) else OUTCOME_OK,
+                                 request=False)
+        return results
+
+    def __getattr__(self, name):
+        if not name.startswith('cmd_'):
+            raise AttributeError(name)
+
+        async def _call(*args):
+            return await self.async_call(name, *args)
+
+        _call.__name__ = name
+        return _call
@@ -1,8 +1,11 @@
+import functools
 import voluptuous as vol
 import logging
 
 from xmlrpc.client import Fault
 
+from homeassistant.const import CONF_OPTIMISTIC
+from homeassistant.core import callback
 from homeassistant.helpers import config_validation as cv
 from homeassistant.components.light import (
     Light, ATTR_BRIGHTNESS, ATTR_RGB_COLOR, SUPPORT_BRIGHTNESS, SUPPORT_RGB_COLOR)
@@ -21,6 +24,9 @@ CONF_MODE = "mode"
 DEFAULT_MODE = "pwm"
 MODES = ['pwm', 'pwmrgb', 'dali']
 
+CONF_MIN_INTERVAL = 'min_interval'
+CONF_ADDRESSES = 'addresses'
+
 DEFAULT_CHANNEL = 255
 BLUE_CHANNEL = 0
 RED_CHANNEL = 1
@@ -28,15 +34,39 @@ GREEN_CHANNEL = 2
 WHITE_CHANNEL = 3
 
 
-PLATFORM_SCHEMA = meshmesh.PLATFORM_SCHEMA.extend({
+PLATFORM_SCHEMA = vol.All(meshmesh.PLATFORM_SCHEMA.extend({
+    vol.Optional(meshmesh.CONF_ADDRESS): cv.positive_int,
+    vol.Optional(CONF_ADDRESSES): vol.All(cv.ensure_list, [cv.positive_int]),
     vol.Required(CONF_MODE): vol.In(MODES),
     vol.Optional(CONF_ON_STATE, default=DEFAULT_ON_STATE): cv.boolean,
     vol.Optional(CONF_ON_BRIGHTNESS, default=DEFAULT_ON_BRIGHTNESS): cv.positive_int,
-})
+    vol.Optional(CONF_MIN_INTERVAL, default=meshmesh.DEFAULT_MIN_INTERVAL): vol.Coerce(float),
+    vol.Optional(CONF_OPTIMISTIC, default=True): cv.boolean,
+}), cv.has_at_least_one_key(meshmesh.CONF_ADDRESS, CONF_ADDRESSES))
 
 
 def setup_platform(hass, config, add_devices, discovery_info=None):
-    add_devices([MeshMeshLight(hass, MeshMeshLightConfig(config))])
+    if discovery_info is not None:
+        add_devices([MeshMeshLight(hass, MeshMeshLightConfig(entity)) for entity in discovery_info[meshmesh.ATTR_DISCOVERED]])
+    elif config.get(CONF_ADDRESSES):
+        add_devices([MeshMeshLightGroup(hass, MeshMeshLightConfig(config))])
+    else:
+        add_devices([MeshMeshLight(hass, MeshMeshLightConfig(config))])
+
+
+def _light_command(mode, bright, colors):
+    """Return the (key, method, args) of the command that sets a light, the node address excluded."""
+    if mode == 'pwm' and bright is not None:
+        return 'light', 'cmd_custom_light_set', (0, 0, 0, bright)
+    elif mode == 'dali' and bright is not None:
+        return 'dali', 'cmd_dali_set_power', (bright,)
+    elif mode == 'pwmrgb':
+        if colors is not None:
+            red, green, blue = colors
+            return 'light', 'cmd_custom_light_set', (red, green, blue, 0)
+        elif bright is not None:
+            return 'light', 'cmd_custom_light_set', (0, 0, 0, bright)
+    return None
 
 
 class MeshMeshLightConfig(meshmesh.MeshMeshConfig):
@@ -52,77 +82,125 @@ class MeshMeshLightConfig(meshmesh.MeshMeshConfig):
     def mode(self):
         return self._config.get(CONF_MODE, DEFAULT_MODE)
 
+    @property
+    def addresses(self):
+        return self._config.get(CONF_ADDRESSES, [])
+
+    @property
+    def min_interval(self):
+        return float(self._config.get(CONF_MIN_INTERVAL, meshmesh.DEFAULT_MIN_INTERVAL))
+
+    @property
+    def optimistic(self):
+        return bool(self._config.get(CONF_OPTIMISTIC, True))
+
 
 class MeshMeshLight(Light):
     def __init__(self, hass, config):
-        self._optimistic = True
+        self._optimistic = config.optimistic or config.address is None
         self._state = config.on_state
         self._brightness = config.on_state_brightness
         self._mode = config.mode
         self._xy_color = (.5, .5)
         self._config = config
-
-    def _set_brighness(self, bright):
-        try:
-            meshmesh.DEVICE.cmd_custom_light_set(0, 0, 0, bright, self._config.address)
-        except Fault:
-            _LOGGER.warning("MeshMeshLight._turn_pwm_on Transmission failure with device at addres: %08X", self._config.address)
-        except ConnectionError:
-            _LOGGER.warning("Connection error with meshmeshhub proxy server")
-
-    def _set_rgb_color(self, red, green, blue):
-        try:
-            meshmesh.DEVICE.cmd_custom_light_set(red, green, blue, 0, self._config.address)
-        except Fault:
-            _LOGGER.warning("MeshMeshLight._set_rgb_color: Transmission failure with device at addres: %08X", self._config.address)
-        except ConnectionError:
-            _LOGGER.warning("MeshMeshLight._set_rgb_color: Connection error with meshmeshhub proxy server")
-
-    def _turn_dali_on(self, bright):
-        _LOGGER.warning("MeshMeshLight._turn_dali_on bright: %d", bright)
-        try:
-            meshmesh.DEVICE.cmd_dali_set_power(bright, self._config.address)
-        except Fault:
-            _LOGGER.warning("MeshMeshLight._turn_dali_on: Transmission failure with device at addres: %08X", self._config.address)
-        except ConnectionError:
-            _LOGGER.warning("MeshMeshLight._turn_dali_on: Connection error with meshmeshhub proxy server")
-
-    def turn_on(self, **kwargs) -> None:
+        self._queue = None
+        self._confirmed = (self._state, self._brightness)
+        self._unconfirmed = 0
+        self._available_unsubs = []
+        if config.address is not None:
+            self._queue = meshmesh.DEVICE.command_queue(config.address, config.min_interval)
+            if not self._optimistic:
+                meshmesh.DEVICE.verifier.register(self)
+
+    async def async_added_to_hass(self):
+        addresses = self._config.addresses or [self._config.address]
+        self._available_unsubs = meshmesh.async_track_available(self.hass, addresses, self._async_probe_due)
+        if self._config.address is not None:
+            self._available_unsubs += meshmesh.async_track_commands(self.hass, addresses, self._async_command_sent)
+
+    async def async_will_remove_from_hass(self):
+        for unsub in self._available_unsubs:
+            unsub()
+        self._available_unsubs = []
+
+    @callback
+    def _async_probe_due(self):
+        self.async_schedule_update_ha_state()
+
+    async def _async_send(self, command, state):
+        key, method, args = command
+        self._unconfirmed += 1
+        self._queue.submit(key, method, *args, done=functools.partial(self._command_done, state))
+
+    @callback
+    def _command_done(self, state, success):
+        """Called when the hub acked, or never acked, the command that sets (is_on, brightness) to state."""
+        self._unconfirmed -= 1
+        if success and self._optimistic:
+            self._confirmed = state
+        elif success:
+            meshmesh.DEVICE.verifier.request(self)
+        if self._unconfirmed == 0:
+            self._state, self._brightness = self._confirmed
+        if self.hass is not None:
+            self.async_schedule_update_ha_state()
+
+    @callback
+    def _async_command_sent(self, method, args):
+        """Adopt the level set by a group or a scene, which skip the command queue of the light."""
+        if self._mode == 'dali' and method == 'cmd_dali_set_power':
+            self.async_verified(args[0])
+        elif self._mode != 'dali' and method == 'cmd_custom_light_set':
+            self.async_verified(args)
+        else:
+            return
+        if not self._optimistic:
+            meshmesh.DEVICE.verifier.request(self)
+
+    def verify_call(self):
+        if self._mode == 'dali':
+            return 'cmd_dali_get_power', (self._config.address,)
+        return 'cmd_custom_light_get', (self._config.address,)
+
+    @callback
+    def async_verified(self, result):
+        """Apply the dali power level, or the (red, green, blue, white) levels, read from the node."""
+        if self._unconfirmed > 0:
+            return
+        if self._mode == 'dali':
+            bright = result
+        else:
+            red, green, blue, white = result
+            bright = white or max(red, green, blue)
+        self._confirmed = (bright > 0, bright)
+        self._state, self._brightness = self._confirmed
+        if self.hass is not None:
+            self.async_schedule_update_ha_state()
+
+    async def async_turn_on(self, **kwargs) -> None:
         bright = kwargs[ATTR_BRIGHTNESS] if ATTR_BRIGHTNESS in kwargs else None
         colors = kwargs[ATTR_RGB_COLOR] if ATTR_RGB_COLOR in kwargs else None
-        _LOGGER.debug("MeshMeshLight.turn_on set light %08X at brightness at %s color at %s", self._config.address, bright, colors)
+        _LOGGER.debug("MeshMeshLight.turn_on set light %s at brightness at %s color at %s", self._config.name, bright, colors)
         if bright is None and colors is None:
             bright = DEFAULT_ON_BRIGHTNESS
 
-        if self._mode == 'pwm' and bright is not None:
-            self._set_brighness(bright)
-        elif self._mode == 'dali' and bright is not None:
-            self._turn_dali_on(bright)
-        elif self._mode == 'pwmrgb':
-            if colors is not None:
-                red, green, blue = colors
-                self._set_rgb_color(red, green, blue)
-            elif bright is not None:
-                self._set_brighness(bright)
-
         if self._optimistic:
             self._state = True
             self._brightness = bright
 
-        self.schedule_update_ha_state()
+        command = _light_command(self._mode, bright, colors)
+        if command is not None:
+            await self._async_send(command, (True, bright))
 
-    def turn_off(self, **kwargs) -> None:
-        if self._mode == 'pwm':
-            self._set_brighness(0)
-        elif self._mode == 'pwmrgb':
-            self._set_brighness(0)
-        elif self._mode == 'dali':
-            self._turn_dali_on(0)
+        self.async_schedule_update_ha_state()
 
+    async def async_turn_off(self, **kwargs) -> None:
         if self._optimistic:
             self._state = False
             self._brightness = 0
-        self.schedule_update_ha_state()
+
+        await self._async_send(_light_command(self._mode, 0, None), (False, 0))
+        self.async_schedule_update_ha_state()
 
     @property
     def brightness(self):
@@ -137,6 +215,14 @@ class MeshMeshLight(Light):
     def should_poll(self):
         return False
 
+    @property
+    def available(self):
+        return meshmesh.DEVICE.accepts_commands(self._config.address)
+
+    @property
+    def device_state_attributes(self):
+        return {meshmesh.ATTR_CONFIRMED: self._unconfirmed == 0}
+
     @property
     def name(self):
         return self._config.name
@@ -151,3 +237,30 @@ class MeshMeshLight(Light):
             return SUPPORT_BRIGHTNESS
         else:
             return SUPPORT_BRIGHTNESS | SUPPORT_RGB_COLOR
+
+
+class MeshMeshLightGroup(MeshMeshLight):
+    """Lights of the same mode on many nodes, set together with one batched hub request. The request
+    goes in order with the command queues of the member nodes, whose light entities adopt the level."""
+
+    async def _async_send(self, command, state):
+        _, method, args = command
+        addresses = self._config.addresses
+        self._unconfirmed += 1
+        results = await meshmesh.async_send_commands(self.hass, [(method, args + (address,)) for address in addresses])
+        success = True
+        for address, result in zip(addresses, results):
+            if isinstance(result, meshmesh.MeshMeshNodeUnavailable):
+                continue
+            if isinstance(result, Fault):
+                success = False
+                _LOGGER.warning("MeshMeshLightGroup._async_send: Transmission failure with device at addres: %08X", address)
+            elif isinstance(result, Exception):
+                success = False
+                _LOGGER.warning("MeshMeshLightGroup._async_send: Connection error with meshmeshhub proxy server")
+                break
+        self._command_done(state, success)
+
+    @property
+    def available(self):
+        return any(meshmesh.DEVICE.accepts_commands(address) for address in self._config.addresses)
@@ -0,0 +1,118 @@
+import time
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+OUTCOME_OK = 'ok'
+OUTCOME_FAULT = 'fault'
+OUTCOME_ERROR = 'error'
+OUTCOME_TIMEOUT = 'timeout'
+
+
+class MeshMeshCallStats(object):
+    """Call counters and latency histogram of a command or of a node."""
+
+    def __init__(self):
+        self.calls = 0
+        self.faults = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.started = time.monotonic()
+
+    def record(self, latency, outcome):
+        self.calls += 1
+        if outcome == OUTCOME_FAULT:
+            self.faults += 1
+        elif outcome == OUTCOME_ERROR:
+            self.errors += 1
+        elif outcome == OUTCOME_TIMEOUT:
+            self.timeouts += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+                break
+
+    def percentile(self, fraction):
+        """Return the upper bound of the histogram bucket holding the given fraction of the calls."""
+        if self.calls == 0:
+            return None
+        target = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return min(LATENCY_BUCKETS[index], self.latency_max)
+        return self.latency_max
+
+    @property
+    def rate(self):
+        """Calls per minute since the first call was recorded."""
+        elapsed = time.monotonic() - self.started
+        return self.calls * 60.0 / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        def _ms(value):
+            return None if value is None else round(value * 1000.0, 1)
+
+        return {
+            'calls': self.calls,
+            'faults': self.faults,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'rate_per_min': round(self.rate, 2),
+            'mean_ms': _ms(self.latency_sum / self.calls) if self.calls else None,
+            'p50_ms': _ms(self.percentile(0.5)),
+            'p95_ms': _ms(self.percentile(0.95)),
+            'p99_ms': _ms(self.percentile(0.99)),
+            'max_ms': _ms(self.latency_max),
+            'histogram': dict(zip([str(bound) for bound in LATENCY_BUCKETS], self.buckets)),
+        }
+
+
+class MeshMeshMetrics(object):
+    """RPC latency and outcome statistics of a hub, per command and per node address."""
+
+    def __init__(self):
+        self._total = MeshMeshCallStats()
+        self._commands = {}
+        self._nodes = {}
+
+    @property
+    def total(self):
+        return self._total
+
+    def command(self, method):
+        return self._commands.get(method)
+
+    def node(self, address):
+        return self._nodes.get(address)
+
+    def record(self, method, address, latency, outcome, request=True):
+        """Record a call, request is False for the calls carried by a system.multicall request, whose
+        latency is their share of the request time."""
+        if request:
+            self._total.record(latency, outcome)
+        stats = self._commands.get(method)
+        if stats is None:
+            stats = self._commands[method] = MeshMeshCallStats()
+        stats.record(latency, outcome)
+        if address is not None:
+            stats = self._nodes.get(address)
+            if stats is None:
+                stats = self._nodes[address] = MeshMeshCallStats()
+            stats.record(latency, outcome)
+
+    def failing_nodes(self):
+        return {'%08X' % address: stats.faults + stats.timeouts for address, stats in self._nodes.items()
+                if stats.faults + stats.timeouts > 0}
+
+    def as_dict(self):
+        return {
+            'total': self._total.as_dict(),
+            'commands': {method: stats.as_dict() for method, stats in self._commands.items()},
+            'nodes': {'%08X' % address: stats.as_dict() for address, stats in self._nodes.items()},
+        }
@@ -0,0 +1,63 @@
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MIN_POLL_INTERVAL = 10.0
+DEFAULT_MAX_POLL_INTERVAL = 300.0
+
+SHRINK_FACTOR = 0.5
+GROW_FACTOR = 1.25
+FAILURE_FACTOR = 2.0
+
+
+class _NodePollState(object):
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_poll = 0.0
+        self.values = {}
+        self.changes = 0
+        self.failures = 0
+
+
+class MeshMeshAdaptivePoller(object):
+    """Learn how often the values of each node change and how reliable the node is, and poll
+    volatile nodes at min_interval while quiet or failing nodes back off towards max_interval."""
+
+    def __init__(self, min_interval=DEFAULT_MIN_POLL_INTERVAL, max_interval=DEFAULT_MAX_POLL_INTERVAL):
+        self._min_interval = min_interval
+        self._max_interval = max(min_interval, max_interval)
+        self._nodes = {}
+
+    def _node(self, address):
+        node = self._nodes.get(address)
+        if node is None:
+            node = self._nodes[address] = _NodePollState(self._min_interval)
+        return node
+
+    def is_due(self, address):
+        node = self._nodes.get(address)
+        return node is None or time.monotonic() >= node.next_poll
+
+    def interval(self, address):
+        node = self._nodes.get(address)
+        return self._min_interval if node is None else node.interval
+
+    def record_result(self, address, key, value):
+        node = self._node(address)
+        previous = node.values.get(key, value)
+        node.values[key] = value
+        node.failures = 0
+        if previous != value:
+            node.changes += 1
+            node.interval = max(self._min_interval, node.interval * SHRINK_FACTOR)
+        else:
+            node.interval = min(self._max_interval, node.interval * GROW_FACTOR)
+        node.next_poll = time.monotonic() + node.interval
+
+    def record_failure(self, address):
+        node = self._node(address)
+        node.failures += 1
+        node.interval = min(self._max_interval, node.interval * FAILURE_FACTOR)
+        node.next_poll = time.monotonic() + node.interval
+        _LOGGER.debug("MeshMeshAdaptivePoller.record_failure: node %08X next poll in %.1fs", address, node.interval)
@@ -0,0 +1,75 @@
+import hmac
+import logging
+
+import xmlrpc.client
+
+from datetime import timedelta
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.const import HTTP_BAD_REQUEST, HTTP_UNAUTHORIZED
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+
+_LOGGER = logging.getLogger(__name__)
+
+PUSH_API_URL = '/api/meshmesh/push'
+SIGNAL_PUSH = 'meshmesh_push_{}'
+RESUBSCRIBE_INTERVAL = timedelta(minutes=5)
+
+
+class MeshMeshPushView(HomeAssistantView):
+    """Receive state change notifications posted by the meshmeshhub.
+
+    The body is a JSON object, or a list of them, shaped like a poll result:
+    {"address": 1234, "cmd": "cmd_digital_in", "value": 3}
+
+    The hub is not a Home Assistant user, it proves itself with the token query parameter instead.
+    """
+
+    url = PUSH_API_URL
+    name = 'api:meshmesh:push'
+    requires_auth = False
+
+    def __init__(self, hub, token):
+        self._hub = hub
+        self._token = token
+
+    async def post(self, request):
+        if not hmac.compare_digest(request.query.get('token', ''), self._token):
+            return self.json_message('Invalid token', HTTP_UNAUTHORIZED)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return self.json_message('Invalid JSON', HTTP_BAD_REQUEST)
+
+        hass = request.app['hass']
+        items = data if isinstance(data, list) else [data]
+        for item in items:
+            try:
+                address = int(item['address'])
+                cmd = item['cmd']
+                value = item['value']
+            except (KeyError, TypeError, ValueError):
+                return self.json_message('Invalid notification', HTTP_BAD_REQUEST)
+            _LOGGER.debug("MeshMeshPushView.post: %s from %08X value %s", cmd, address, value)
+            self._hub.coordinator.invalidate(address)
+            async_dispatcher_send(hass, SIGNAL_PUSH.format(address), cmd, value)
+
+        return self.json({'received': len(items)})
+
+
+async def async_setup_push(hass, hub, callback_url, token):
+    """Expose the push endpoint and ask the hub to post state changes to callback_url."""
+    hass.http.register_view(MeshMeshPushView(hub, token))
+    callback_url = '%s?token=%s' % (callback_url, token)
+
+    async def _async_subscribe(*args):
+        for server in hub.hubs:
+            try:
+                await server.async_call('subscribe', callback_url)
+            except (xmlrpc.client.Error, ConnectionError) as e:
+                _LOGGER.warning("async_setup_push: Subscription to meshmeshhub %s push failed: %s", server.name, e)
+
+    await _async_subscribe()
+    async_track_time_interval(hass, _async_subscribe, RESUBSCRIBE_INTERVAL)
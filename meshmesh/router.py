@@ -0,0 +1,191 @@
+import asyncio
+import logging
+
+from collections import OrderedDict
+
+from .hub import DEFAULT_BATCH_TIMEOUT
+from .scheduler import PRIORITY_COMMAND
+from .verify import MeshMeshVerifier
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class MeshMeshRoutedCoordinator(object):
+    """The coordinator interface of a router, every read goes to the coordinator of the node hub."""
+
+    def __init__(self, router):
+        self._router = router
+        self._store = None
+
+    def _coordinator(self, address):
+        return self._router.route(address).coordinator
+
+    @property
+    def store(self):
+        return self._store
+
+    @store.setter
+    def store(self, store):
+        self._store = store
+        for hub in self._router.hubs:
+            hub.coordinator.store = store
+
+    def restore(self, entries, spread):
+        # Nodes are assigned to their hub while the entities are created, after the restore
+        for hub in self._router.hubs:
+            hub.coordinator.restore(entries, spread)
+
+    def value_age(self, address):
+        return self._coordinator(address).value_age(address)
+
+    def register_pin(self, address, pin):
+        self._coordinator(address).register_pin(address, pin)
+
+    def pin_mask(self, address):
+        return self._coordinator(address).pin_mask(address)
+
+    async def async_read_pins(self, address, pin):
+        return await self._coordinator(address).async_read_pins(address, pin)
+
+    def invalidate(self, address):
+        self._coordinator(address).invalidate(address)
+
+    async def async_read(self, method, *args, cached=False):
+        return await self._coordinator(args[-1]).async_read(method, *args, cached=cached)
+
+
+class MeshMeshHubRouter(object):
+    """Several meshmeshhub servers behind the MeshMeshHub interface.
+
+    A node is served by the hub it was assigned to with the hub option of its entities, else by the
+    first hub whose address range holds its address, else by the first hub. Every hub keeps its own
+    request limiter, read batches and command queues, so the hubs work in parallel; they share the
+    circuit breaker and the metrics, which are keyed by node address."""
+
+    def __init__(self, hass, hubs, ranges, max_batch):
+        self._hubs = OrderedDict((hub.name, hub) for hub in hubs)
+        self._ranges = ranges
+        self._default = hubs[0]
+        self._assigned = {}
+        self._coordinator = MeshMeshRoutedCoordinator(self)
+        self._verifier = MeshMeshVerifier(hass, self, max_batch)
+
+    @property
+    def name(self):
+        return self._default.name
+
+    @property
+    def url(self):
+        return self._default.url
+
+    @property
+    def hubs(self):
+        return list(self._hubs.values())
+
+    @property
+    def coordinator(self):
+        return self._coordinator
+
+    @property
+    def verifier(self):
+        return self._verifier
+
+    @property
+    def breaker(self):
+        return self._default.breaker
+
+    @property
+    def metrics(self):
+        return self._default.metrics
+
+    def assign(self, address, name):
+        hub = self._hubs.get(name)
+        if hub is None:
+            _LOGGER.error("MeshMeshHubRouter.assign: unknown hub %s for node %08X", name, address)
+            return
+        self._assigned[address] = hub
+
+    def route(self, address):
+        hub = self._assigned.get(address)
+        if hub is None:
+            hub = self._default
+            for first, last, candidate in self._ranges:
+                if first <= address <= last:
+                    hub = candidate
+                    break
+            self._assigned[address] = hub
+        return hub
+
+    @property
+    def shedding_level(self):
+        return max(hub.shedding_level for hub in self.hubs)
+
+    def shedding_state(self):
+        return {hub.name: hub.shedding_state() for hub in self.hubs}
+
+    def set_load_shedding(self, enabled, latency_threshold):
+        for hub in self.hubs:
+            hub.set_load_shedding(enabled, latency_threshold)
+
+    def is_available(self, address):
+        return self.route(address).is_available(address)
+
+    def accepts_commands(self, address):
+        return self.route(address).accepts_commands(address)
+
+    def set_startup_deadline(self, seconds):
+        for hub in self.hubs:
+            hub.set_startup_deadline(seconds)
+
+    def set_timeouts(self, default, commands=None, batch=DEFAULT_BATCH_TIMEOUT):
+        for hub in self.hubs:
+            hub.set_timeouts(default, commands, batch)
+
+    async def async_initial_update(self, entities):
+        groups = OrderedDict()
+        for entity in entities:
+            groups.setdefault(self.route(entity.config.address), []).append(entity)
+        await asyncio.gather(*[hub.async_initial_update(group) for hub, group in groups.items()])
+
+    def command_queue(self, address, min_interval=None):
+        return self.route(address).command_queue(address, min_interval)
+
+    async def async_start(self):
+        await asyncio.gather(*[hub.async_start() for hub in self.hubs])
+
+    async def async_close(self):
+        self._verifier.stop()
+        await asyncio.gather(*[hub.async_close() for hub in self.hubs])
+
+    def _hub_of_call(self, method, args):
+        return self.route(args[-1]) if method.startswith('cmd_') and args else self._default
+
+    async def async_request(self, method, *args, priority=PRIORITY_COMMAND):
+        return await self._hub_of_call(method, args).async_request(method, *args, priority=priority)
+
+    async def async_call(self, method, *args, priority=PRIORITY_COMMAND):
+        return await self._hub_of_call(method, args).async_call(method, *args, priority=priority)
+
+    async def async_batch(self, calls, priority=PRIORITY_COMMAND):
+        """Split the calls by hub and send the batches of all the hubs in parallel."""
+        groups = OrderedDict()
+        for index, (method, args) in enumerate(calls):
+            groups.setdefault(self.route(args[-1]), []).append(index)
+
+        results = [None] * len(calls)
+        replies = await asyncio.gather(*[hub.async_batch([calls[index] for index in indexes], priority)
+                                         for hub, indexes in groups.items()])
+        for indexes, hub_results in zip(groups.values(), replies):
+            for index, result in zip(indexes, hub_results):
+                results[index] = result
+        return results
+
+    def __getattr__(self, name):
+        if not name.startswith('cmd_'):
+            raise AttributeError(name)
+
+        async def _call(*args):
+            return await self.async_call(name, *args)
+
+        _call.__name__ = name
+        return _call
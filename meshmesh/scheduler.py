@@ -0,0 +1,67 @@
+import asyncio
+import heapq
+import itertools
+
+PRIORITY_COMMAND = 0
+PRIORITY_VERIFY = 1
+PRIORITY_POLL = 2
+
+
+class _PrioritySlot(object):
+    def __init__(self, limiter, priority):
+        self._limiter = limiter
+        self._priority = priority
+
+    async def __aenter__(self):
+        await self._limiter.async_acquire(self._priority)
+
+    async def __aexit__(self, *exc):
+        self._limiter.release()
+
+
+class MeshMeshPriorityLimiter(object):
+    """Cap the requests in flight and hand free slots to the waiter with the lowest priority value."""
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    @property
+    def active(self):
+        return self._active
+
+    def slot(self, priority):
+        return _PrioritySlot(self, priority)
+
+    async def async_acquire(self, priority):
+        if self._active < self._limit and not self._waiters:
+            self._active += 1
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self._active -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+                return
@@ -16,8 +16,10 @@ CONF_MAX_VOLTS = 'max_volts'
 DEFAULT_VOLTS = 1.2
 DEPENDENCIES = ['meshmesh']
 
-TYPES = ['analog', 'current', 'temperature', 'pressure', 'humidity', 'thermometer']
-NAMES_TYPE = ['Analog', 'Current', 'Temperature', 'Pressure', 'Humidity', 'Temperature']
+TYPES = ['analog', 'current', 'temperature', 'pressure', 'humidity', 'thermometer', 'latency']
+NAMES_TYPE = ['Analog', 'Current', 'Temperature', 'Pressure', 'Humidity', 'Temperature', 'Latency']
+
+HUB_METRICS = ['latency', 'failures', 'shedding']
 
 PLATFORM_SCHEMA = meshmesh.PLATFORM_SCHEMA.extend({
     vol.Required(CONF_TYPE): vol.In(TYPES),
@@ -25,14 +27,28 @@ PLATFORM_SCHEMA = meshmesh.PLATFORM_SCHEMA.extend({
 })
 
 
-def setup_platform(hass, config, add_devices, discovery_info=None):
+def _create_device(hass, config):
     typ = config.get(CONF_TYPE)
-
     if typ == 'analog':
-        add_devices([meshmesh.MeshMeshAnalogIn(hass, meshmesh.MeshMeshAnalogInConfig(config))], True)
+        return meshmesh.MeshMeshAnalogIn(hass, meshmesh.MeshMeshAnalogInConfig(config))
+    return MeshMeshSensor(typ, meshmesh.MeshMeshDigitalInConfig(config))
+
+
+async def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
+    if discovery_info is not None and meshmesh.ATTR_DISCOVERED not in discovery_info:
+        async_add_devices([MeshMeshHubMetricsSensor(kind) for kind in HUB_METRICS], True)
+        return True
+
+    if discovery_info is not None:
+        devices = [_create_device(hass, entity) for entity in discovery_info[meshmesh.ATTR_DISCOVERED]]
+    elif config.get(CONF_TYPE) == 'latency':
+        async_add_devices([MeshMeshNodeMetricsSensor(meshmesh.MeshMeshConfig(config))], True)
+        return True
     else:
-        add_devices([MeshMeshSensor(typ, meshmesh.MeshMeshDigitalInConfig(config))], True)
+        devices = [_create_device(hass, config)]
 
+    async_add_devices(devices)
+    hass.async_create_task(meshmesh.DEVICE.async_initial_update(devices))
     return True
 
 
@@ -54,6 +70,14 @@ class MeshMeshSensor(Entity):
     def should_poll(self):
         return self._config.should_poll
 
+    @property
+    def available(self):
+        return meshmesh.DEVICE.is_available(self._config.address)
+
+    @property
+    def device_state_attributes(self):
+        return meshmesh.value_age_attributes(self._config.address)
+
     @property
     def state(self):
         return self._value
@@ -73,17 +97,17 @@ class MeshMeshSensor(Entity):
         elif self._sens_type == 'thermometer':
             return '°C'
 
-    def update(self):
+    async def async_update(self):
         try:
             if self._sens_type == 'thermometer':
-                value = meshmesh.DEVICE.cmd_custom_thermo_sample(0, self._config.address) / 10.0
+                value = await meshmesh.DEVICE.coordinator.async_read('cmd_custom_thermo_sample', 0, self._config.address) / 10.0
                 if value > 5.0:
                     self._value = value
 
             elif self._sens_type == 'current':
-                self._value = meshmesh.DEVICE.cmd_custom_current_sample(self._config.address) / 4.0
+                self._value = await meshmesh.DEVICE.coordinator.async_read('cmd_custom_current_sample', self._config.address) / 4.0
             else:
-                temp, press, humi = meshmesh.DEVICE.cmd_weather_data(self._config.address)
+                temp, press, humi = await meshmesh.DEVICE.coordinator.async_read('cmd_weather_data', self._config.address, cached=True)
                 if self._sens_type == 'temperature':
                     self._value = temp
                 elif self._sens_type == 'humidity':
@@ -94,7 +118,77 @@ class MeshMeshSensor(Entity):
                     self._value = None
                 elif self._sens_type == 'pressure':
                     self._value = press
+        except meshmesh.MeshMeshNodeUnavailable:
+            pass
         except Fault:
             _LOGGER.warning("Transmission failure when attempting to get sample from MeshMesh device at address: %08X", self._config.address)
         except ConnectionError:
             _LOGGER.warning("Connection error with meshmeshhub proxy server")
+
+
+class MeshMeshNodeMetricsSensor(Entity):
+    """95th percentile RPC latency of a node, the other statistics are exposed as attributes."""
+
+    def __init__(self, config):
+        self._config = config
+        self._stats = {}
+
+    @property
+    def name(self):
+        return self._config.name
+
+    @property
+    def config(self):
+        return self._config
+
+    @property
+    def state(self):
+        return self._stats.get('p95_ms')
+
+    @property
+    def unit_of_measurement(self):
+        return 'ms'
+
+    @property
+    def device_state_attributes(self):
+        return self._stats
+
+    async def async_update(self):
+        stats = meshmesh.DEVICE.metrics.node(self._config.address)
+        self._stats = stats.as_dict() if stats is not None else {}
+
+
+class MeshMeshHubMetricsSensor(Entity):
+    def __init__(self, kind):
+        self._kind = kind
+        self._value = None
+        self._attributes = {}
+
+    @property
+    def name(self):
+        return 'MeshMesh hub %s' % self._kind
+
+    @property
+    def state(self):
+        return self._value
+
+    @property
+    def unit_of_measurement(self):
+        return 'ms' if self._kind == 'latency' else None
+
+    @property
+    def device_state_attributes(self):
+        return self._attributes
+
+    async def async_update(self):
+        metrics = meshmesh.DEVICE.metrics
+        if self._kind == 'latency':
+            total = metrics.total.as_dict()
+            self._value = total['p95_ms']
+            self._attributes = {key: value for key, value in total.items() if key != 'histogram'}
+        elif self._kind == 'failures':
+            self._value = metrics.total.faults + metrics.total.errors + metrics.total.timeouts
+            self._attributes = metrics.failing_nodes()
+        elif self._kind == 'shedding':
+            self._value = meshmesh.DEVICE.shedding_level
+            self._attributes = meshmesh.DEVICE.shedding_state()
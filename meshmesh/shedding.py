@@ -0,0 +1,93 @@
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+SHED_NONE = 0
+SHED_LOW = 1
+SHED_ALL = 2
+
+LOW_PRIORITY_READS = ('cmd_read_analog', 'cmd_custom_thermo_sample', 'cmd_custom_current_sample')
+ESSENTIAL_READS = ('cmd_digital_in', 'cmd_custom_presence_get', 'cmd_dali_presence')
+
+DEFAULT_SHED_LATENCY = 2.0
+DEPTH_FACTOR = 2
+LATENCY_ALPHA = 0.2
+RECOVERY_STEP = 15.0
+
+
+class MeshMeshLoadShedder(object):
+    """Shed polls of a hub under load. The pressure is the larger of the requests waiting for a slot,
+    relative to DEPTH_FACTOR times the in flight limit, and of the moving average of the request
+    latency, per call for a multicall, relative to latency_threshold.
+
+    A pressure of 1 sheds the low priority reads, a pressure of 2 every read but the essential ones
+    (presence and digital inputs). A shed read is answered from the cache, so reads never made yet are
+    always sent. The level rises at once and falls one step at a time, RECOVERY_STEP seconds apart,
+    while the pressure stays half a level below the current one."""
+
+    def __init__(self, limiter, latency_threshold=DEFAULT_SHED_LATENCY, enabled=True):
+        self._limiter = limiter
+        self.latency_threshold = latency_threshold
+        self.enabled = enabled
+        self._latency = 0.0
+        self._recorded = time.monotonic()
+        self._level = SHED_NONE
+        self._changed = time.monotonic()
+        self.shed = 0
+
+    @property
+    def level(self):
+        return self._level if self.enabled else SHED_NONE
+
+    @property
+    def latency(self):
+        return self._latency
+
+    def pressure(self):
+        depth = self._limiter.waiting / float(max(1, self._limiter.limit * DEPTH_FACTOR))
+        return max(depth, self._latency / self.latency_threshold)
+
+    def record(self, latency):
+        self._latency += LATENCY_ALPHA * (latency - self._latency)
+        self._recorded = time.monotonic()
+        self._evaluate()
+
+    def _evaluate(self):
+        now = time.monotonic()
+        if now - self._recorded > RECOVERY_STEP:
+            # No request completed lately, the average decays so that the level can recover
+            self._latency /= 2.0
+            self._recorded = now
+
+        pressure = self.pressure()
+        target = SHED_ALL if pressure >= 2.0 else SHED_LOW if pressure >= 1.0 else SHED_NONE
+        level = self._level
+        if target > level:
+            level = target
+        elif target < level and pressure < level - 0.5 and now - self._changed >= RECOVERY_STEP:
+            level -= 1
+
+        if level != self._level:
+            _LOGGER.info("MeshMeshLoadShedder: shedding level %d -> %d (pressure %.2f)", self._level, level, pressure)
+            self._level = level
+            self._changed = now
+
+    def should_shed(self, method):
+        """Return True when a poll of method can be answered from the cache instead of the hub."""
+        if not self.enabled or method in ESSENTIAL_READS:
+            return False
+        self._evaluate()
+        if self._level == SHED_ALL or (self._level == SHED_LOW and method in LOW_PRIORITY_READS):
+            self.shed += 1
+            return True
+        return False
+
+    def as_dict(self):
+        return {
+            'level': self.level,
+            'pressure': round(self.pressure(), 2),
+            'latency_ms': round(self._latency * 1000.0, 1),
+            'waiting': self._limiter.waiting,
+            'shed': self.shed,
+        }
@@ -0,0 +1,365 @@
+"""Local stand-in for the meshmeshhub XML-RPC server.
+
+Run it with: python simulator.py --nodes 500 --latency 0.02 --loss 0.01 --port 8801
+"""
+import argparse
+import json
+import logging
+import random
+import socketserver
+import struct
+import threading
+import time
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.client import Fault
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8801
+DEFAULT_BINARY_PORT = 8802
+DEFAULT_NODES = 100
+DEFAULT_FIRST_ADDRESS = 1
+DEFAULT_LATENCY = 0.02
+DEFAULT_JITTER = 0.5
+DEFAULT_LOSS = 0.0
+DEFAULT_PARALLEL_FRAMES = 1
+DEFAULT_CHANGE_RATE = 0.05
+
+FAULT_TRANSMISSION = 1
+FAULT_UNKNOWN_NODE = 2
+
+NODE_PROFILES = (
+    {'weather': True, 'current': True},
+    {'digital_in': 0x0F, 'digital_out': 0xF0},
+    {'dali': True, 'dali_presence': True},
+    {'light': 'pwmrgb', 'presence': True},
+    {'thermometer': True, 'analog': True, 'clima': True},
+)
+
+
+class SimulatedNode(object):
+    def __init__(self, address):
+        self.address = address
+        self.online = True
+        self.temperature = round(random.uniform(18.0, 24.0), 1)
+        self.pressure = round(random.uniform(990.0, 1030.0), 1)
+        self.humidity = round(random.uniform(35.0, 60.0), 1)
+        self.port = 0
+        self.analog = random.randint(0, 1023)
+        self.current = random.randint(0, 400)
+        self.presence = False
+        self.dali_level = 0
+        self.dali_status = 0
+        self.light = (0, 0, 0, 0)
+        self.clima = (0, 20, 0, 1)
+        self.firmware = '1.4.%d' % (address % 3)
+        self.capabilities = NODE_PROFILES[address % len(NODE_PROFILES)]
+
+    def values(self):
+        """Return the value of every read of the node by (cmd, args without the address)."""
+        return {
+            ('cmd_weather_data',): [self.temperature, self.pressure, self.humidity],
+            ('cmd_custom_thermo_sample', 0): int(self.temperature * 10),
+            ('cmd_custom_current_sample',): self.current,
+            ('cmd_read_analog',): self.analog,
+            ('cmd_digital_in',): self.port,
+            ('cmd_custom_presence_get',): self.presence,
+            ('cmd_dali_presence',): self.presence,
+            ('cmd_dali_status',): self.dali_status,
+            ('cmd_dali_get_power',): self.dali_level,
+            ('cmd_custom_light_get',): list(self.light),
+        }
+
+    def drift(self):
+        """Random walk of the values a real node would measure, return the changed (cmd, value) pairs."""
+        changes = []
+        self.temperature = round(self.temperature + random.choice((-0.1, 0.0, 0.1)), 1)
+        self.humidity = round(min(100.0, max(0.0, self.humidity + random.choice((-0.5, 0.0, 0.5)))), 1)
+        self.analog = min(1023, max(0, self.analog + random.randint(-8, 8)))
+        self.current = max(0, self.current + random.randint(-4, 4))
+        if random.random() < 0.5:
+            self.presence = not self.presence
+            changes.append(('cmd_custom_presence_get', self.presence))
+            changes.append(('cmd_dali_presence', self.presence))
+        if random.random() < 0.5:
+            self.port ^= 1 << random.randint(0, 7)
+            changes.append(('cmd_digital_in', self.port))
+        return changes
+
+
+class MeshMeshSimulatedHub(object):
+    """Implements the cmd_* surface of the meshmeshhub on a set of simulated nodes. Every mesh command
+    costs latency seconds (+/- jitter) of airtime, at most parallel_frames commands are on air at the
+    same time and each command is lost with probability loss."""
+
+    def __init__(self, nodes=DEFAULT_NODES, first_address=DEFAULT_FIRST_ADDRESS, latency=DEFAULT_LATENCY,
+                 jitter=DEFAULT_JITTER, loss=DEFAULT_LOSS, parallel_frames=DEFAULT_PARALLEL_FRAMES):
+        self.nodes = {address: SimulatedNode(address) for address in range(first_address, first_address + nodes)}
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.frames = 0
+        self.requests = 0
+        self.subscribers = []
+        self.sequence = 0
+        self._journal = {}
+        self._airtime = threading.BoundedSemaphore(parallel_frames)
+        self._lock = threading.Lock()
+        for node in self.nodes.values():
+            self._journal_node(node)
+
+    def _dispatch(self, method, params):
+        if method == 'subscribe':
+            return self.subscribe(*params)
+        if method == 'node_inventory':
+            return self.node_inventory()
+        if method == 'changes_since':
+            return self.changes_since(*params)
+        if not method.startswith('cmd_'):
+            raise Fault(-32601, 'Method %s not supported' % method)
+        handler = getattr(self, method, None)
+        if handler is None:
+            raise Fault(-32601, 'Method %s not supported' % method)
+        node = self._transmit(params[-1])
+        result = handler(node, *params[:-1])
+        self._journal_node(node)
+        return result
+
+    def _transmit(self, address):
+        node = self.nodes.get(address)
+        if node is None:
+            raise Fault(FAULT_UNKNOWN_NODE, 'Unknown node %08X' % address)
+        with self._airtime:
+            with self._lock:
+                self.frames += 1
+            if self.latency > 0:
+                time.sleep(self.latency * random.uniform(1.0 - self.jitter, 1.0 + self.jitter))
+        if not node.online or random.random() < self.loss:
+            raise Fault(FAULT_TRANSMISSION, 'Transmission failure with node %08X' % address)
+        return node
+
+    def subscribe(self, url):
+        with self._lock:
+            if url not in self.subscribers:
+                self.subscribers.append(url)
+        return True
+
+    def _journal_node(self, node):
+        """Give a new sequence number to the reads of node whose value changed."""
+        with self._lock:
+            for key, value in node.values().items():
+                entry = self._journal.get((node.address, key))
+                if entry is None or entry[1] != value:
+                    self.sequence += 1
+                    self._journal[(node.address, key)] = (self.sequence, value)
+
+    def changes_since(self, seq):
+        with self._lock:
+            changes = [{'address': address, 'cmd': key[0], 'args': list(key[1:]), 'value': value}
+                       for (address, key), (changed, value) in self._journal.items() if changed > seq]
+            return {'seq': self.sequence, 'changes': changes}
+
+    def node_inventory(self):
+        return [{'address': node.address, 'firmware': node.firmware, 'capabilities': node.capabilities}
+                for node in self.nodes.values() if node.online]
+
+    def notify(self, address, cmd, value):
+        body = json.dumps({'address': address, 'cmd': cmd, 'value': value}).encode()
+        for url in list(self.subscribers):
+            request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(request, timeout=2).close()
+            except OSError as e:
+                _LOGGER.warning("MeshMeshSimulatedHub.notify: push to %s failed: %s", url, e)
+
+    def drift(self, change_rate=DEFAULT_CHANGE_RATE):
+        for node in self.nodes.values():
+            if random.random() < change_rate:
+                for cmd, value in node.drift():
+                    self.notify(node.address, cmd, value)
+                self._journal_node(node)
+
+    # Mesh commands, the node address is stripped from the arguments
+
+    def cmd_weather_data(self, node):
+        return [node.temperature, node.pressure, node.humidity]
+
+    def cmd_custom_thermo_sample(self, node, index):
+        return int(node.temperature * 10)
+
+    def cmd_custom_current_sample(self, node):
+        return node.current
+
+    def cmd_read_analog(self, node):
+        return node.analog
+
+    def cmd_digital_in(self, node, mask):
+        return node.port & mask
+
+    def cmd_digital_out(self, node, mask, value):
+        node.port = (node.port & ~mask) | (value & mask)
+        return True
+
+    def cmd_custom_presence_get(self, node):
+        return node.presence
+
+    def cmd_custom_light_set(self, node, red, green, blue, white):
+        node.light = (red, green, blue, white)
+        return True
+
+    def cmd_custom_light_get(self, node):
+        return list(node.light)
+
+    def cmd_dali_get_power(self, node):
+        return node.dali_level
+
+    def cmd_dali_status(self, node):
+        return node.dali_status
+
+    def cmd_dali_presence(self, node):
+        return node.presence
+
+    def cmd_dali_set_power(self, node, level):
+        node.dali_level = level
+        node.dali_status = 0x02 if level > 0 else 0x00
+        return True
+
+    def cmd_clima_set_ac_state(self, node, mode, temp, fan, vane):
+        node.clima = (mode, temp, fan, vane)
+        return True
+
+
+class _QuietRequestHandler(SimpleXMLRPCRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class MeshMeshSimulatorServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+    def __init__(self, hub, host='localhost', port=DEFAULT_PORT):
+        SimpleXMLRPCServer.__init__(self, (host, port), requestHandler=_QuietRequestHandler, allow_none=True,
+                                    logRequests=False)
+        self.hub = hub
+        self.register_multicall_functions()
+        self.register_instance(hub)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/' % (host, port)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='meshmesh-simulator', daemon=True)
+        thread.start()
+        return thread
+
+
+class _BinaryRequestHandler(socketserver.BaseRequestHandler):
+    """Serves the length-prefixed msgpack frames of a connection, replies are sent as soon as each
+    request completes so that pipelined requests overlap."""
+    header = struct.Struct('>I')
+
+    def _read(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    def _reply(self, msgid, fault, result):
+        payload = self.server.msgpack.packb([msgid, fault, result], use_bin_type=True)
+        with self._lock:
+            self.request.sendall(self.header.pack(len(payload)) + payload)
+
+    def _serve(self, msgid, method, params):
+        try:
+            if method == 'system.multicall':
+                result = []
+                for call in params[0]:
+                    try:
+                        result.append([self.server.hub._dispatch(call['methodName'], call['params'])])
+                    except Fault as e:
+                        result.append({'faultCode': e.faultCode, 'faultString': e.faultString})
+            else:
+                result = self.server.hub._dispatch(method, params)
+            self._reply(msgid, None, result)
+        except Fault as e:
+            self._reply(msgid, [e.faultCode, e.faultString], None)
+        except OSError:
+            pass
+
+    def handle(self):
+        self._lock = threading.Lock()
+        with ThreadPoolExecutor(self.server.workers) as executor:
+            try:
+                while True:
+                    length, = self.header.unpack(self._read(self.header.size))
+                    msgid, method, params = self.server.msgpack.unpackb(self._read(length), raw=False)
+                    executor.submit(self._serve, msgid, method, params)
+            except (EOFError, OSError):
+                pass
+
+
+class MeshMeshBinarySimulatorServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """msgpack frame server of the simulated hub, for the tcp:// transport."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, hub, host='localhost', port=DEFAULT_BINARY_PORT, workers=16):
+        import msgpack
+        socketserver.TCPServer.__init__(self, (host, port), _BinaryRequestHandler)
+        self.hub = hub
+        self.msgpack = msgpack
+        self.workers = workers
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'tcp://%s:%d' % (host, port)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='meshmesh-binary-simulator', daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local meshmeshhub simulator')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--binary-port', type=int, help='also serve msgpack frames on this port (tcp:// transport)')
+    parser.add_argument('--nodes', type=int, default=DEFAULT_NODES)
+    parser.add_argument('--first-address', type=int, default=DEFAULT_FIRST_ADDRESS)
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help='airtime of a mesh frame in seconds')
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, help='relative latency jitter')
+    parser.add_argument('--loss', type=float, default=DEFAULT_LOSS, help='probability of a lost frame')
+    parser.add_argument('--parallel-frames', type=int, default=DEFAULT_PARALLEL_FRAMES)
+    parser.add_argument('--change-rate', type=float, default=DEFAULT_CHANGE_RATE,
+                        help='probability per second that a node changes its inputs')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    hub = MeshMeshSimulatedHub(args.nodes, args.first_address, args.latency, args.jitter, args.loss, args.parallel_frames)
+    server = MeshMeshSimulatorServer(hub, args.host, args.port)
+    server.start()
+    _LOGGER.info("Simulating %d nodes on %s", args.nodes, server.url)
+    if args.binary_port is not None:
+        binary = MeshMeshBinarySimulatorServer(hub, args.host, args.binary_port)
+        binary.start()
+        _LOGGER.info("Binary transport on %s", binary.url)
+    try:
+        while True:
+            time.sleep(1.0)
+            hub.drift(args.change_rate)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import logging
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = 'meshmesh.values'
+STORAGE_VERSION = 1
+SAVE_DELAY = 30
+
+
+class MeshMeshValueStore(object):
+    """Last value read for every (command, args) key, saved to .storage with a debounce."""
+
+    def __init__(self, hass):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._values = {}
+
+    async def async_load(self):
+        """Return the saved values as a list of (key, value, timestamp)."""
+        data = await self._store.async_load()
+        entries = []
+        for method, args, value, timestamp in (data or {}).get('values', []):
+            key = (method,) + tuple(args)
+            self._values[key] = (value, timestamp)
+            entries.append((key, value, timestamp))
+        _LOGGER.debug("MeshMeshValueStore.async_load: %d values restored", len(entries))
+        return entries
+
+    @callback
+    def async_record(self, key, value):
+        self._values[key] = (value, time.time())
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self):
+        return {'values': [[key[0], list(key[1:]), value, timestamp] for key, (value, timestamp) in self._values.items()]}
@@ -1,18 +1,28 @@
 import voluptuous as vol
 
+from homeassistant.const import CONF_OPTIMISTIC
+from homeassistant.helpers import config_validation as cv
+
 from homeassistant.components.switch import (SwitchDevice)
 from .. import meshmesh
 
 CONF_ON_STATE = 'on_state'
+CONF_RELAY_BANK = 'relay_bank'
 DEPENDENCIES = ['meshmesh']
 STATES = ['high', 'low']
 
 PLATFORM_SCHEMA = meshmesh.PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_ON_STATE): vol.In(STATES),
+    vol.Optional(CONF_RELAY_BANK, default=False): cv.boolean,
+    vol.Optional(CONF_OPTIMISTIC, default=True): cv.boolean,
 })
 
 
 def setup_platform(hass, config, add_devices, discovery_info=None):
+    if discovery_info is not None:
+        add_devices([MeshMeshSwitch(hass, meshmesh.MeshMeshDigitalOutConfig(entity))
+                     for entity in discovery_info[meshmesh.ATTR_DISCOVERED]])
+        return
     add_devices([MeshMeshSwitch(hass, meshmesh.MeshMeshDigitalOutConfig(config))])
 
 
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import struct
+import urllib.parse
+
+import xmlrpc.client
+
+import aiohttp
+
+_LOGGER = logging.getLogger(__name__)
+
+BINARY_SCHEMES = ('tcp', 'unix')
+DEFAULT_BINARY_PORT = 8802
+DEFAULT_POOL_SIZE = 4
+DEFAULT_KEEPALIVE = 60.0
+
+FRAME_HEADER = struct.Struct('>I')
+
+
+def create_transport(url, pool_size=DEFAULT_POOL_SIZE):
+    """Return the transport for the scheme of url: XML-RPC over HTTP, or msgpack frames for tcp:// and unix://."""
+    if urllib.parse.urlparse(url).scheme in BINARY_SCHEMES:
+        return MeshMeshBinaryTransport(url)
+    return MeshMeshXmlRpcTransport(url, pool_size)
+
+
+class MeshMeshXmlRpcTransport(object):
+    """XML-RPC requests over a pool of at most pool_size keep-alive HTTP connections."""
+
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE):
+        self._url = url
+        self._pool_size = pool_size
+        self._session = None
+
+    def _create_session(self):
+        connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=DEFAULT_KEEPALIVE)
+        return aiohttp.ClientSession(connector=connector)
+
+    async def async_start(self):
+        if self._session is None:
+            self._session = self._create_session()
+
+    async def async_close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def async_reconnect(self):
+        """Drop the pooled connections, the requests still running on them fail with a connection error."""
+        session, self._session = self._session, self._create_session()
+        if session is not None:
+            await session.close()
+
+    async def _async_post(self, body):
+        try:
+            async with self._session.post(self._url, data=body, headers={'Content-Type': 'text/xml'}) as resp:
+                if resp.status != 200:
+                    raise xmlrpc.client.ProtocolError(self._url, resp.status, resp.reason, dict(resp.headers))
+                return await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ConnectionError("MeshMeshXmlRpcTransport: %s" % e) from e
+
+    async def async_call(self, method, args):
+        payload = await self._async_post(xmlrpc.client.dumps(tuple(args), method, allow_none=True))
+        result, _ = xmlrpc.client.loads(payload)
+        return result[0]
+
+
+class MeshMeshBinaryTransport(object):
+    """msgpack requests in length-prefixed frames over a persistent TCP or Unix socket.
+
+    A request is [id, method, params] and its reply [id, fault, result], fault being None or
+    [faultCode, faultString]. Requests are pipelined on the socket and replies may come in any order."""
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlparse(url)
+        self._url = url
+        self._unix = parsed.scheme == 'unix'
+        self._host = parsed.hostname
+        self._port = parsed.port or DEFAULT_BINARY_PORT
+        self._path = parsed.path
+        self._msgpack = None
+        self._lock = None
+        self._writer = None
+        self._reader_task = None
+        self._pending = {}
+        self._next_id = 0
+
+    async def async_start(self):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ConnectionError("MeshMeshBinaryTransport: the msgpack package is required for %s" % self._url) from e
+        self._msgpack = msgpack
+        self._lock = asyncio.Lock()
+
+    async def async_close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self._disconnect(ConnectionError("MeshMeshBinaryTransport: transport closed"))
+
+    async def async_reconnect(self):
+        """Close the socket, the next call opens a new one."""
+        await self.async_close()
+
+    async def _async_connect(self):
+        async with self._lock:
+            if self._writer is not None:
+                return
+            try:
+                if self._unix:
+                    reader, writer = await asyncio.open_unix_connection(self._path)
+                else:
+                    reader, writer = await asyncio.open_connection(self._host, self._port)
+            except OSError as e:
+                raise ConnectionError("MeshMeshBinaryTransport: %s" % e) from e
+            self._writer = writer
+            self._reader_task = asyncio.ensure_future(self._async_read_replies(reader))
+            _LOGGER.debug("MeshMeshBinaryTransport: connected to %s", self._url)
+
+    def _disconnect(self, error):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._reader_task = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _async_read_replies(self, reader):
+        try:
+            while True:
+                length, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                msgid, fault, result = self._msgpack.unpackb(await reader.readexactly(length), raw=False)
+                future = self._pending.pop(msgid, None)
+                if future is None or future.done():
+                    continue
+                if fault is not None:
+                    future.set_exception(xmlrpc.client.Fault(*fault))
+                else:
+                    future.set_result(result)
+        except (asyncio.IncompleteReadError, OSError, ValueError) as e:
+            _LOGGER.warning("MeshMeshBinaryTransport: connection to %s lost (%s)", self._url, e)
+            self._disconnect(ConnectionError("MeshMeshBinaryTransport: %s" % e))
+        except Exception as e:
+            # A malformed reply, the stream can not be trusted any more
+            _LOGGER.warning("MeshMeshBinaryTransport: invalid reply from %s (%r)", self._url, e)
+            self._disconnect(ConnectionError("MeshMeshBinaryTransport: invalid reply (%r)" % e))
+
+    async def async_call(self, method, args):
+        if self._writer is None:
+            await self._async_connect()
+
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        msgid = self._next_id
+        future = asyncio.get_event_loop().create_future()
+        self._pending[msgid] = future
+        payload = self._msgpack.packb([msgid, method, list(args)], use_bin_type=True)
+        try:
+            self._writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+            await self._writer.drain()
+        except OSError as e:
+            self._disconnect(ConnectionError("MeshMeshBinaryTransport: %s" % e))
+        try:
+            return await future
+        finally:
+            self._pending.pop(msgid, None)
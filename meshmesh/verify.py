@@ -0,0 +1,74 @@
+import logging
+
+from .scheduler import PRIORITY_VERIFY
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_VERIFY_INTERVAL = 60.0
+VERIFY_DELAY = 1.0
+
+
+class MeshMeshVerifier(object):
+    """Read back the state of non optimistic actuators in batched, low priority requests: shortly after
+    one of their commands is acked and then every interval seconds.
+
+    Registered entities provide verify_call(), the (method, args) of the read that returns their state,
+    and async_verified(result) that applies it. Entities of a node reading the same thing share one call."""
+
+    def __init__(self, hass, hub, max_batch):
+        self._hass = hass
+        self._hub = hub
+        self._max_batch = max_batch
+        self._entities = []
+        self._requested = []
+        self._flush_handle = None
+        self._sweep_handle = None
+        self._interval = None
+
+    def register(self, entity):
+        self._entities.append(entity)
+
+    def request(self, entity):
+        """Verify entity with the next batch, VERIFY_DELAY seconds from the first request."""
+        if entity not in self._requested:
+            self._requested.append(entity)
+        if self._flush_handle is None:
+            self._flush_handle = self._hass.loop.call_later(VERIFY_DELAY, self._flush)
+
+    def start(self, interval=DEFAULT_VERIFY_INTERVAL):
+        self._interval = interval
+        if self._sweep_handle is None and interval > 0:
+            self._sweep_handle = self._hass.loop.call_later(interval, self._sweep)
+
+    def stop(self):
+        for handle in (self._flush_handle, self._sweep_handle):
+            if handle is not None:
+                handle.cancel()
+        self._flush_handle = self._sweep_handle = None
+
+    def _flush(self):
+        self._flush_handle = None
+        entities, self._requested = self._requested, []
+        self._hass.async_create_task(self.async_verify(entities))
+
+    def _sweep(self):
+        self._sweep_handle = self._hass.loop.call_later(self._interval, self._sweep)
+        if self._entities:
+            self._hass.async_create_task(self.async_verify(list(self._entities)))
+
+    async def async_verify(self, entities):
+        calls = {}
+        for entity in entities:
+            method, args = entity.verify_call()
+            calls.setdefault((method,) + tuple(args), []).append(entity)
+
+        keys = list(calls)
+        for index in range(0, len(keys), self._max_batch):
+            chunk = keys[index:index + self._max_batch]
+            results = await self._hub.async_batch([(key[0], key[1:]) for key in chunk], priority=PRIORITY_VERIFY)
+            for key, result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    _LOGGER.debug("MeshMeshVerifier.async_verify: %s of %08X failed: %s", key[0], key[-1], result)
+                    continue
+                for entity in calls[key]:
+                    entity.async_verified(result)